@@ -0,0 +1,108 @@
+import time
+import numpy as np
+import pandas as pd
+from data_provider import get_provider
+from indicators import Panel, compute_indicators, latest_table
+from streaming import REGISTRY
+from strategies import score_table, action_category
+from stock_db import get_stock_name, THEME_TICKERS
+from scan_store import compact_snap, load_history
+from profiling import stage, count
+from chip_crawler import clean_code
+
+# --- 核心分析 (不依賴 Streamlit：介面與背景掃描程式共用) ---
+def analyze_stock_strategy(ticker, strategy_mode, strict_mode, bypass_filter=False, df=None):
+    try:
+        # df 可由批次抓取預先提供；未提供時才單檔下載
+        with stage("分析/抓取"): df = get_provider().fetch_one(ticker, period="6mo") if df is None else df
+        if df is None or len(df) < 60: return None
+        with stage("分析/指標"): panel = Panel.from_frames({ticker: df}); ind = compute_indicators(panel); latest = latest_table(panel, ind).loc[ticker]
+        with stage("分析/評分"): return evaluate_latest(ticker, latest, lambda: panel.frame(ticker, ind), strategy_mode, strict_mode, bypass_filter)
+    except: return None
+
+def scan_universe(frames):
+    # 全部個股一次對齊成面板計算指標，所有策略一次評分；session 只留精簡的最新列與評分，History 需要時再向共用快取載入
+    frames = {t: df for t, df in frames.items() if df is not None and len(df) >= 60}
+    if not frames: return None
+    count("掃描/檔數", len(frames))
+    with stage("掃描/指標"): panel = Panel.from_frames(frames); ind = compute_indicators(panel); snap = latest_table(panel, ind)
+    with stage("掃描/評分"): return {"snap": compact_snap(snap), "scores": score_table(snap)}
+
+def live_scan(scan_list):
+    # 盤中刷新：本地資料庫只補抓最新 K 棒，指標以串流狀態 O(1) 更新 (新增或修正盤中 K 棒) 後重新評分
+    frames = {t: df for t, df in get_provider().fetch(scan_list, period="6mo").items() if len(df) >= 60}
+    if not frames: return None
+    with stage("即時/串流更新"): snap = pd.DataFrame([REGISTRY.update(t, df) for t, df in frames.items()], index=list(frames))
+    return {"snap": compact_snap(snap), "scores": score_table(snap)}
+
+def merge_scans(parts):
+    # 分段掃描 (多 process / 分批) 的結果接回一份
+    parts = [p for p in parts if p]
+    if not parts: return None
+    return {"snap": pd.concat([p["snap"] for p in parts]), "scores": {m: pd.concat([p["scores"][m] for p in parts]) for m in parts[0]["scores"]}}
+
+def subset_scan(scan, tickers):
+    keep = scan["snap"].index.isin(list(tickers))
+    return {"snap": scan["snap"][keep], "scores": {m: sc[keep] for m, sc in scan["scores"].items()}}
+
+# --- 分段掃描 (全市場)：先用最近幾根 K 棒做流動性 / 股價初篩，留下的才分批抓半年行情算完整指標 ---
+PREFILTER = {"period": "1mo", "bars": 5, "min_price": 10.0, "min_value": 2e7} # 近 5 日平均成交金額 ≥ 2,000 萬元
+SCAN_CHUNK = 200
+
+def prefilter(frames, bars=5, min_price=10.0, min_value=2e7, exempt=THEME_TICKERS):
+    # 初篩只針對全市場清單帶進來的個股；exempt (預設為手動整理的主題板塊) 有資料就保留，低價權值股不會被悄悄排除
+    frames = {t: df for t, df in frames.items() if df is not None and len(df)}
+    if not frames: return []
+    panel = Panel.from_frames(frames, length=bars)
+    value = np.nanmean(panel.close * panel.volume, axis=0)
+    keep = ((panel.close[-1] >= min_price) & (value >= min_value)) | np.isin(panel.tickers, list(exempt))
+    return [t for t, k in zip(panel.tickers, keep) if k]
+
+def staged_scan(tickers, chunk=SCAN_CHUNK, progress=None, **criteria):
+    # 產生器：每算完一批就 yield 目前累積的結果，介面可以邊掃邊顯示；progress(階段, 完成數, 總數, 該階段每秒檔數)
+    p = {**PREFILTER, **criteria}; provider = get_provider(); tickers = list(dict.fromkeys(tickers))
+    def report(stage, done, total, seconds):
+        if progress: progress(stage, done, total, done / max(seconds, 1e-9))
+    t0 = time.perf_counter()
+    quick = provider.fetch(tickers, period=p["period"], progress=lambda d, n: report("初篩", d, n, time.perf_counter() - t0))
+    with stage("掃描/初篩"): survivors = prefilter(quick, p["bars"], p["min_price"], p["min_value"])
+    count("掃描/初篩剔除", len(tickers) - len(survivors))
+    report("初篩", len(tickers), len(tickers), time.perf_counter() - t0)
+    parts = []; fetch_s = score_s = 0.0
+    for i in range(0, len(survivors), chunk):
+        part = survivors[i:i+chunk]; done = i + len(part)
+        t1 = time.perf_counter(); frames = provider.fetch(part, period="6mo"); fetch_s += time.perf_counter() - t1
+        report("行情", done, len(survivors), fetch_s)
+        t1 = time.perf_counter(); parts.append(scan_universe(frames)); score_s += time.perf_counter() - t1
+        report("評分", done, len(survivors), score_s)
+        yield merge_scans(parts)
+
+# 結果表其餘文字欄位同樣用固定類別 (見 strategies.ACTION_DTYPE)
+MACD_DTYPE = pd.CategoricalDtype(["多頭", "空頭"])
+STATUS_DTYPE = pd.CategoricalDtype(["", "⚠️ 未入選 (不符策略)"])
+
+def rank_results(scan, strategy_mode, strict_mode, bypass_filter=False):
+    # 由已快取的全策略評分產生目前策略的結果表；切換策略或嚴格模式只重新排序，不重新掃描
+    snap = scan["snap"]; sc = scan["scores"][strategy_mode]
+    selected = sc["入選(嚴格)" if strict_mode else "入選"].to_numpy(dtype=bool)
+    keep = selected | bypass_filter; s = snap[keep]; sc = sc[keep]; selected = selected[keep]
+    price = s['Close']; ma20 = s['MA20']; clean = [clean_code(t) for t in s.index]
+    out = pd.DataFrame({
+        "代號": s.index, "名稱": [get_stock_name(t) for t in s.index], "現價": price,
+        "漲跌幅%": (price - s['Prev_Close']) / s['Prev_Close'] * 100,
+        "總分": sc["總分"], "RSI": s['RSI'], "相對量能": np.where(s['Vol_MA5'] > 0, s['Volume'] / s['Vol_MA5'], 0.0), "MFI": s['MFI'],
+        "BB寬度": s['BB_Width'], "布林型態": sc["布林型態"],
+        "MACD": pd.Categorical(np.where(s['MACD'] > s['MACD_Signal'], "多頭", "空頭"), dtype=MACD_DTYPE),
+        "乖離率": ((price - ma20) / ma20 * 100).round(2), "訊號": sc["訊號"], "建議": action_category(sc["總分"]),
+        "主力成本": s['Big_Player_Cost'], "支撐價": ma20, "狀態": pd.Categorical(np.where(selected, "", "⚠️ 未入選 (不符策略)"), dtype=STATUS_DTYPE),
+        "大戶籌碼連結": [f"https://goodinfo.tw/tw/EquityDistributionClassHis.asp?STOCK_ID={c}" for c in clean]
+    }, index=s.index)
+    return out.sort_values(by="總分", ascending=False, kind="stable").reset_index(drop=True)
+
+def evaluate_latest(ticker, latest, history, strategy_mode, strict_mode, bypass_filter=False):
+    # 單檔評分 (深度透視用)：latest 為 latest_table 的一列或串流狀態的 latest()；history 需要時才呼叫
+    snap = pd.DataFrame([dict(latest)], index=[ticker])
+    table = rank_results({"snap": snap, "scores": score_table(snap)}, strategy_mode, strict_mode, bypass_filter)
+    if table.empty: return None
+    d = table.iloc[0].to_dict(); d["History"] = load_history(ticker, history)
+    return d
@@ -1,14 +1,22 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import requests
-from ta.trend import SMAIndicator, MACD
-from ta.momentum import RSIIndicator
-from ta.volume import OnBalanceVolumeIndicator, MFIIndicator
-from ta.volatility import BollingerBands
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import time
+# yfinance / plotly / ta 只在用到的函式裡才載入，冷啟動與一般 rerun 不必付出匯入成本
+from data_provider import get_provider, trim_period
+from ohlcv_store import OHLCVStore
+from cache import cached, cache_stats
+from chip_crawler import get_crawler, clean_code
+from deep_dive import run_with_budget, once
+from strategies import STRATEGIES, decode_signals, action_for
+from stock_db import STOCK_DB, FLAT_STOCK_DB
+from scan_store import session_memory, process_peak_rss, HISTORY_PERIOD
+from analysis import analyze_stock_strategy, staged_scan, live_scan, rank_results, subset_scan
+from scan_worker import load_latest_snapshot
+from correlation import get_correlations, lookup_one, BENCHMARKS, WINDOWS, DEFAULT_WINDOW
+from timeframes import MTF_RULES, TF_LABELS, mtf_scan, confirm, rule_timeframes, fetch_base, DEEP_TIMEFRAMES
+from charts import plot_gauge, plot_chart
+from profiling import STATS, stage, timed
 
 # --- 頁面設定 ---
 st.set_page_config(page_title="台股 AI 戰情室 V20.0", layout="wide", page_icon="🦅")
@@ -27,94 +35,47 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- 資料庫 ---
-STOCK_DB = {
-    "💻 半導體權值": {"2330.TW": "台積電", "2454.TW": "聯發科", "2317.TW": "鴻海", "2303.TW": "聯電", "2308.TW": "台達電", "3711.TW": "日月光", "2379.TW": "瑞昱", "3034.TW": "聯詠", "3661.TW": "世芯-KY", "3443.TW": "創意", "6669.TW": "緯穎", "3035.TW": "智原", "3529.TW": "力旺", "5274.TW": "信驊", "3231.TW": "緯創", "2382.TW": "廣達", "2357.TW": "華碩", "2356.TW": "英業達", "2376.TW": "技嘉", "2324.TW": "仁寶"},
-    "⚡ 重電/綠能": {"1519.TW": "華城", "1513.TW": "中興電", "1503.TW": "士電", "1504.TW": "東元", "1514.TW": "亞力", "1609.TW": "大亞", "1605.TW": "華新", "1618.TW": "合機", "1616.TW": "億泰", "6806.TW": "森崴能源", "9958.TW": "世紀鋼", "3708.TW": "上緯投控", "6443.TW": "元晶"},
-    "🖥️ PCB/載板": {"3037.TW": "欣興", "8046.TW": "南電", "3189.TW": "景碩", "2368.TW": "金像電", "3044.TW": "健鼎", "6274.TW": "台燿", "2383.TW": "台光電", "6213.TW": "聯茂", "4958.TW": "臻鼎-KY", "2313.TW": "華通", "5469.TW": "瀚宇博", "8358.TW": "金居", "6269.TW": "台郡", "2355.TW": "敬鵬"},
-    "🤖 機器人/散熱": {"3017.TW": "奇鋐", "3324.TW": "雙鴻", "3483.TW": "力致", "2421.TW": "建準", "2354.TW": "鴻準", "2059.TW": "川湖", "2049.TW": "上銀", "1590.TW": "亞德客-KY", "2359.TW": "所羅門", "6188.TW": "廣明", "8374.TW": "羅昇", "2464.TW": "盟立"},
-    "📡 網通/低軌": {"2345.TW": "智邦", "5388.TWO": "中磊", "6285.TW": "啟碁", "3704.TW": "合勤控", "3596.TW": "智易", "4977.TW": "眾達-KY", "4906.TW": "正文", "3062.TW": "建漢", "2314.TW": "台揚", "3081.TW": "聯亞", "4979.TW": "華星光"},
-    "💰 金融/控股": {"2881.TW": "富邦金", "2882.TW": "國泰金", "2891.TW": "中信金", "2886.TW": "兆豐金", "5880.TW": "合庫金", "2884.TW": "玉山金", "5871.TW": "中租-KY", "2892.TW": "第一金", "2885.TW": "元大金", "2890.TW": "永豐金", "2883.TW": "開發金", "2887.TW": "台新金", "2834.TW": "臺企銀", "2809.TW": "京城銀"},
-    "🚢 航運/傳產": {"2603.TW": "長榮", "2609.TW": "陽明", "2615.TW": "萬海", "2618.TW": "長榮航", "2610.TW": "華航", "2606.TW": "裕民", "2637.TW": "慧洋-KY", "2002.TW": "中鋼", "1101.TW": "台泥", "1301.TW": "台塑", "1303.TW": "南亞", "1326.TW": "台化", "6505.TW": "台塑化", "2207.TW": "和泰車", "2912.TW": "統一超", "1216.TW": "統一", "2201.TW": "裕隆"},
-    "📱 光電/其他": {"3008.TW": "大立光", "3406.TW": "玉晶光", "2409.TW": "友達", "3481.TW": "群創", "2327.TW": "國巨", "2492.TW": "華新科", "3260.TWO": "威剛", "8299.TWO": "群聯", "2395.TW": "研華", "8454.TW": "富邦媒", "2412.TW": "中華電", "3045.TW": "台灣大", "4904.TW": "遠傳"}
-}
-FLAT_STOCK_DB = {ticker: name for sector, stocks in STOCK_DB.items() for ticker, name in stocks.items()}
-
-def get_stock_name(ticker): return FLAT_STOCK_DB.get(ticker, ticker.replace(".TW", ""))
 def get_name_online(ticker):
     name = FLAT_STOCK_DB.get(ticker)
     if name: return name
+    return fetch_name_online(ticker) or ticker
+
+@cached("name")
+@timed("抓取/名稱")
+def fetch_name_online(ticker):
+    import yfinance as yf
     try: return yf.Ticker(ticker).info.get('longName', ticker)
-    except: return ticker
+    except: return None
 
+@cached("quote", cache_if=lambda v: v != (0, 0))
+@timed("抓取/美債殖利率")
 def get_macro_data():
+    import yfinance as yf
     try:
         tnx = yf.Ticker("^TNX"); hist = tnx.history(period="5d")
         return hist['Close'].iloc[-1], hist['Close'].iloc[-1] - hist['Close'].iloc[-2]
     except: return 0, 0
 
-def calculate_correlation(ticker):
-    try:
-        benchmark = "^SOX" if any(x in ticker for x in ["2330","2454","2379","2303"]) else "^GSPC"
-        stock = yf.download(ticker, period="3mo", progress=False)['Close']
-        bench = yf.download(benchmark, period="3mo", progress=False)['Close']
-        df = pd.concat([stock, bench], axis=1).dropna()
-        return df.iloc[:,0].corr(df.iloc[:,1]), benchmark
-    except: return 0, "N/A"
-
-# --- V20.0 升級版大戶籌碼爬蟲 (更強的抓取邏輯) ---
-def get_chip_data_histock(ticker):
-    clean_ticker = ticker.replace(".TW", "").replace(".TWO", "")
-    url = f"https://histock.tw/stock/large.aspx?no={clean_ticker}"
-    
-    # 模擬真實瀏覽器 Header
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Language": "zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7"
-    }
-    
+# 連動係數：查全市場相關係數表 (每個交易日算一次，見 correlation.py)，取連動最高的基準；
+# 當日表還沒算好時只算這一檔 (全市場重算交給背景掃描程式或板塊連動分頁，不在深度透視裡觸發)
+@timed("相關係數/查表")
+def calculate_correlation(ticker, window=DEFAULT_WINDOW, df=None):
     try:
-        response = requests.get(url, headers=headers, timeout=5) # 設定超時
-        if response.status_code == 200:
-            tables = pd.read_html(response.text)
-            target_df = None
-            
-            # 尋找含有「週別」的表格
-            for df in tables:
-                if "週別" in df.columns.astype(str) or "日期" in df.columns.astype(str):
-                    target_df = df
-                    break
-            
-            if target_df is not None and len(target_df) >= 2:
-                # 模糊比對欄位名稱 (網站可能會改名)
-                col_1000 = [c for c in target_df.columns if "1000" in str(c) and "%" in str(c)]
-                col_400 = [c for c in target_df.columns if "400" in str(c) and "%" in str(c)]
-                
-                if col_1000 and col_400:
-                    latest = target_df.iloc[0]; prev = target_df.iloc[1]
-                    
-                    # 處理數值 (轉為 float)
-                    val_1000 = float(latest[col_1000[0]])
-                    val_400 = float(latest[col_400[0]])
-                    
-                    diff_1000 = val_1000 - float(prev[col_1000[0]])
-                    diff_400 = val_400 - float(prev[col_400[0]])
-                    
-                    return {
-                        "400張": val_400,
-                        "400張增減": diff_400,
-                        "1000張": val_1000,
-                        "1000張增減": diff_1000,
-                        "日期": str(latest[0])
-                    }
+        table = get_correlations(compute=False)
+        return table.lookup(ticker, window, df) if table else lookup_one(ticker, window, df=df)
     except Exception as e:
-        print(f"Error fetching chip data: {e}")
-        pass
-    return None
+        print(f"Error in correlation lookup: {e}")
+        return 0, "N/A"
+
+# --- V20.0 升級版大戶籌碼爬蟲 (連線池 + 每週快取，見 chip_crawler.py) ---
+def get_chip_data_histock(ticker):
+    return get_crawler().get(ticker)
 
 # --- 基本面分析 ---
+@cached("fundamentals")
+@timed("抓取/基本面")
 def get_advanced_fundamentals(ticker):
+    import yfinance as yf
     try:
         info = yf.Ticker(ticker).info
         rev_growth = info.get('revenueGrowth')
@@ -153,159 +114,206 @@ def get_advanced_fundamentals(ticker):
         }
     except: return None
 
-# --- 核心分析 ---
-def analyze_stock_strategy(ticker, strategy_mode, strict_mode, bypass_filter=False):
-    try:
-        df = yf.download(ticker, period="6mo", interval="1d", progress=False)
-        if len(df) < 60: return None
-        if isinstance(df.columns, pd.MultiIndex): df.columns = df.columns.get_level_values(0)
-        
-        df['MA5'] = SMAIndicator(df['Close'], 5).sma_indicator()
-        df['MA20'] = SMAIndicator(df['Close'], 20).sma_indicator()
-        df['MA60'] = SMAIndicator(df['Close'], 60).sma_indicator()
-        df['RSI'] = RSIIndicator(df['Close'], 14).rsi()
-        df['Vol_MA5'] = SMAIndicator(df['Volume'], 5).sma_indicator()
-        macd = MACD(df['Close']); df['MACD'] = macd.macd(); df['MACD_Signal'] = macd.macd_signal(); df['MACD_Hist'] = macd.macd_diff()
-        df['OBV'] = OnBalanceVolumeIndicator(df['Close'], df['Volume']).on_balance_volume()
-        df['OBV_MA10'] = SMAIndicator(df['OBV'], 10).sma_indicator()
-        df['MFI'] = MFIIndicator(df['High'], df['Low'], df['Close'], df['Volume'], 14).money_flow_index()
-        bb = BollingerBands(df['Close']); df['BB_High'] = bb.bollinger_hband(); df['BB_Low'] = bb.bollinger_lband(); df['BB_Width'] = (df['BB_High']-df['BB_Low'])/df['MA20']
-
-        latest = df.iloc[-1]; price = float(latest['Close'])
-        vol_ratio = float(latest['Volume']/latest['Vol_MA5']) if latest['Vol_MA5']>0 else 0
-        bias_20 = (price - latest['MA20'])/latest['MA20']*100
-        recent_20 = df.iloc[-20:]
-        max_vol_idx = recent_20['Volume'].idxmax()
-        big_player_cost = float((recent_20.loc[max_vol_idx]['Open'] + recent_20.loc[max_vol_idx]['Close']) / 2)
-
-        score = 0; signals = []; is_selected = False; bb_status = "一般"
-
-        if strategy_mode == "🚀 短線噴射 (飆股)":
-            if vol_ratio > 1.5: score+=25; signals.append("爆量")
-            if price > latest['BB_High']: score+=25; signals.append("布林突破")
-            if latest['BB_Width'] < 0.15: score+=10; signals.append("壓縮")
-            if latest['MACD_Hist']>0 and latest['MACD_Hist']>df['MACD_Hist'].iloc[-2]: score+=20; signals.append("MACD翻紅")
-            min_score = 75 if strict_mode else 60
-            min_vol = 2.0 if strict_mode else 1.5
-            if (price > latest['BB_High'] or vol_ratio > min_vol) and score >= min_score: is_selected = True
-            if price > latest['BB_High']: bb_status = "🚀 突破噴出"
-
-        elif strategy_mode == "🌊 波段成長 (趨勢)":
-            if latest['MA5']>latest['MA20']>latest['MA60']: score+=30; signals.append("均線多排")
-            if latest['OBV']>latest['OBV_MA10']: score+=20; signals.append("籌碼吸納")
-            if latest['MACD']>latest['MACD_Signal']: score+=20; signals.append("MACD金叉")
-            if price > latest['MA20']: score+=10
-            min_score = 75 if strict_mode else 60
-            if latest['MA5']>latest['MA20'] and score >= min_score: is_selected = True
-
-        elif strategy_mode == "💎 長線價值 (低接)":
-            if abs(price-latest['MA20'])/latest['MA20']<0.03: score+=30; signals.append("回測月線")
-            if 40<=latest['RSI']<=60: score+=20
-            if bias_20 < -5: score+=20; signals.append("負乖離超跌")
-            min_score = 65 if strict_mode else 50
-            if price > latest['MA60'] and latest['RSI'] < 70 and score >= min_score: is_selected = True
-
-        action = "觀察"
-        if score >= 80: action = "🔥 強力買進"
-        elif score >= 60: action = "✅ 建議佈局"
-        
-        clean_ticker = ticker.replace(".TW", "").replace(".TWO", "")
-        chip_link = f"https://goodinfo.tw/tw/EquityDistributionClassHis.asp?STOCK_ID={clean_ticker}"
-
-        if is_selected or bypass_filter:
-            status_note = "" if is_selected else "⚠️ 未入選 (不符策略)"
-            return {
-                "代號": ticker, "名稱": get_stock_name(ticker), "現價": price,
-                "漲跌幅%": float((price - df['Close'].iloc[-2]) / df['Close'].iloc[-2] * 100),
-                "總分": score, "RSI": float(latest['RSI']), "相對量能": vol_ratio, "MFI": float(latest['MFI']),
-                "BB寬度": float(latest['BB_Width']), "布林型態": bb_status,
-                "MACD": "多頭" if latest['MACD'] > latest['MACD_Signal'] else "空頭",
-                "乖離率": round(bias_20, 2), "訊號": signals, "建議": action, "History": df, 
-                "主力成本": big_player_cost, "支撐價": float(latest['MA20']), "狀態": status_note,
-                "大戶籌碼連結": chip_link
-            }
-        return None
-    except: return None
-
-# --- 繪圖函數 ---
-def plot_gauge(value, title):
-    fig = go.Figure(go.Indicator(
-        mode="gauge+number", value=value, title={'text': title, 'font': {'size': 18, 'color': '#333'}},
-        number={'font': {'size': 36}},
-        gauge={'axis': {'range': [0, 100], 'tickwidth': 1, 'tickcolor': "#666"},
-               'bar': {'color': "#222", 'thickness': 0.6}, 'bgcolor': "white", 'borderwidth': 1, 'bordercolor': "#ddd",
-               'steps': [{'range': [0, 30], 'color': "#ffcdd2"}, {'range': [30, 70], 'color': "#fff9c4"}, {'range': [70, 100], 'color': "#c8e6c9"}],
-               'threshold': {'line': {'color': "#d32f2f", 'width': 4}, 'thickness': 0.75, 'value': value}}))
-    fig.update_layout(height=250, margin=dict(l=30, r=30, t=50, b=10), paper_bgcolor="rgba(0,0,0,0)", font={'family': "Arial"})
-    return fig
-
-def plot_chart(data):
-    df = data['History']; name = data['名稱']
-    fig = make_subplots(rows=4, cols=1, shared_xaxes=True, row_heights=[0.5, 0.15, 0.15, 0.2], subplot_titles=(f"{name} 走勢", "成交量", "MACD", "OBV"))
-    fig.add_trace(go.Candlestick(x=df.index, open=df['Open'], high=df['High'], low=df['Low'], close=df['Close'], name='K線'), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df.index, y=df['MA20'], line=dict(color='blue', width=1), name='月線'), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df.index, y=df['BB_High'], line=dict(color='gray', width=1, dash='dot'), name='布林上'), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df.index, y=df['BB_Low'], line=dict(color='gray', width=1, dash='dot'), name='布林下'), row=1, col=1)
-    fig.add_trace(go.Bar(x=df.index, y=df['Volume'], marker_color=['red' if o<c else 'green' for o,c in zip(df['Open'],df['Close'])], name='量'), row=2, col=1)
-    fig.add_trace(go.Bar(x=df.index, y=df['MACD_Hist'], marker_color=['red' if v>0 else 'green' for v in df['MACD_Hist']], name='MACD柱'), row=3, col=1)
-    fig.add_trace(go.Scatter(x=df.index, y=df['MACD'], line=dict(color='orange', width=1), name='DIF'), row=3, col=1)
-    fig.add_trace(go.Scatter(x=df.index, y=df['MACD_Signal'], line=dict(color='blue', width=1), name='DEA'), row=3, col=1)
-    fig.add_trace(go.Scatter(x=df.index, y=df['OBV'], line=dict(color='purple', width=2), name='OBV'), row=4, col=1)
-    fig.update_layout(height=900, xaxis_rangeslider_visible=False, showlegend=True, margin=dict(l=10,r=10,t=30,b=10))
-    return fig
+# --- 篩選結果表 (target 可為 st 或 st.empty() 佔位，掃描中逐批覆寫) ---
+def show_results(target, df, strategy_mode):
+    def style_rows(row):
+        if "強力" in row['建議']: return ['background-color: #ffebee; color: #c62828; font-weight: bold']*len(row)
+        return ['background-color: #f1f8e9; color: #33691e']*len(row)
+    cols = ["代號", "名稱", "現價", "漲跌幅%", "總分", "主力成本", "建議", "訊號"]
+    if strategy_mode == "🚀 短線噴射 (飆股)": cols.insert(6, "布林型態")
+    display_df = df.copy(); display_df['訊號'] = [", ".join(decode_signals(b)) for b in df['訊號']]
+    target.dataframe(
+        display_df[cols].style.apply(style_rows, axis=1).format("{:.2f}", subset=["現價", "漲跌幅%", "總分", "主力成本"]), 
+        use_container_width=True, height=600,
+        column_config={"大戶籌碼連結": st.column_config.LinkColumn("集保籌碼", display_text="查看")}
+    )
+
+# --- 深度透視各區塊 (依資料到達順序逐塊繪製) ---
+def render_deep_dive(target, tasks, got, ph, drawn):
+    def ready(*keys): return all(k in got or k not in tasks for k in keys)
+    def once(key):
+        if key in drawn: return False
+        drawn.add(key); return True
+    if not ready("data") or got["data"] is None: return
+    data = got["data"]; fund_data = got.get("fund"); chip_data = got.get("chip"); corr_data = got.get("corr") or (0, "N/A")
+    if got.get("name"): data['名稱'] = got["name"]
+    name = data['名稱']
+
+    with ph["header"].container():
+        st.markdown("---")
+        st.subheader(f"📊 {name} ({target}) 12指標戰情牆")
+        if data['狀態']: st.warning(f"💡 提示：此股票目前 {data['狀態']}，但我們已為您強制輸出分析報告。")
+
+    if once("gauge"):
+        with ph["gauge"].container():
+            g1, g2, g3 = st.columns(3)
+            with g1: st.plotly_chart(plot_gauge(data['總分'], f"{strategy_mode} 評分"), use_container_width=True)
+            with g2: st.plotly_chart(plot_gauge(data['RSI'], "RSI 動能"), use_container_width=True)
+            with g3: st.plotly_chart(plot_gauge(data['MFI'], "MFI 資金流"), use_container_width=True)
+
+    if ready("fund", "chip") and once("fund_row"):
+        with ph["fund_row"].container():
+            st.markdown("### 🦅 12 大關鍵指標透視")
+            m1, m2, m3, m4 = st.columns(4)
+            if fund_data:
+                m1.markdown(f"<div class='indicator-box'>EPS / 營收<br><br><span style='font-size:1.5em'>{fund_data['EPS(預估)']} / {fund_data['營收成長']}</span></div>", unsafe_allow_html=True)
+                m2.markdown(f"<div class='indicator-box'>本益比 (P/E)<br><br><span style='font-size:1.5em'>{fund_data['本益比']}</span></div>", unsafe_allow_html=True)
+                m3.markdown(f"<div class='indicator-box'>股價淨值比<br><br><span style='font-size:1.5em'>{fund_data['股價淨值比']}</span></div>", unsafe_allow_html=True)
+                
+                # [V20 修改] 優先顯示 400 張大戶 (自動爬取)
+                if chip_data:
+                    val = chip_data['400張']; diff = chip_data['400張增減']
+                    color = "red" if diff > 0 else "green" if diff < 0 else "black"
+                    symbol = "▲" if diff > 0 else "▼" if diff < 0 else ""
+                    m4.markdown(f"<div class='chip-box-success'>👑 400張大戶<br><br><span style='font-size:1.5em; color:{color}'>{val}% {symbol}</span></div>", unsafe_allow_html=True)
+                else:
+                    m4.markdown(f"<div class='indicator-box'>內部人持股<br><br><span style='font-size:1.5em'>{fund_data['內部人持股']}</span></div>", unsafe_allow_html=True)
+
+    if ready("chip") and once("tech_row"):
+        with ph["tech_row"].container():
+            st.markdown("")
+            t1, t2, t3, t4 = st.columns(4)
+            t1.markdown(f"<div class='indicator-box'>MACD 趨勢<br><br><span style='font-size:1.5em'>{data['MACD']}</span></div>", unsafe_allow_html=True)
+            t2.markdown(f"<div class='indicator-box'>均線乖離率<br><br><span style='font-size:1.5em'>{data['乖離率']}%</span></div>", unsafe_allow_html=True)
+            t3.markdown(f"<div class='indicator-box'>大戶成本<br><br><span style='font-size:1.5em'>{data['主力成本']:.2f}</span></div>", unsafe_allow_html=True)
+            
+            # [V20 修改] 優先顯示 1000 張大戶 (自動爬取)
+            if chip_data:
+                val = chip_data['1000張']; diff = chip_data['1000張增減']
+                color = "red" if diff > 0 else "green" if diff < 0 else "black"
+                symbol = "▲" if diff > 0 else "▼" if diff < 0 else ""
+                t4.markdown(f"<div class='chip-box-success'>👑 1000張大戶<br><br><span style='font-size:1.5em; color:{color}'>{val}% {symbol}</span></div>", unsafe_allow_html=True)
+            else:
+                # 讀取失敗或逾時時顯示按鈕
+                t4.link_button("⚠️ 籌碼讀取失敗 (請點此查看)", data['大戶籌碼連結'], use_container_width=True)
+
+    if ready("corr") and once("macro_row"):
+        with ph["macro_row"].container():
+            st.markdown("")
+            o1, o2, o3, o4 = st.columns(4)
+            o1.markdown(f"<div class='indicator-box'>美股連動 ({corr_data[1]}·{DEFAULT_WINDOW}日)<br><br><span style='font-size:1.5em'>{corr_data[0]:.2f}</span></div>", unsafe_allow_html=True)
+            o2.markdown(f"<div class='indicator-box'>Fed 利率環境<br><br><span style='font-size:1.5em'>{rate:.2f}%</span></div>", unsafe_allow_html=True)
+            cl_t = clean_code(target)
+            with o3: st.link_button("📊 查看信用交易 (Yahoo)", f"https://tw.stock.yahoo.com/quote/{cl_t}/margin-trading", use_container_width=True)
+            with o4: st.link_button("⚖️ 查看法人買賣 (Goodinfo)", f"https://goodinfo.tw/tw/StockDetail.asp?STOCK_ID={cl_t}", use_container_width=True)
+
+    if ready("mtf") and once("mtf_row") and got.get("mtf"):
+        with ph["mtf_row"].container():
+            st.markdown(f"### 🧭 多週期評分 ({strategy_mode})")
+            cols = st.columns(len(got["mtf"]))
+            for col, (tf, res) in zip(cols, got["mtf"].items()):
+                sc = res["scores"][strategy_mode]
+                if target not in sc.index: continue
+                score = int(sc.loc[target, "總分"])
+                col.markdown(f"<div class='indicator-box'>{TF_LABELS[tf]}<br><br><span style='font-size:1.5em'>{score} 分｜{action_for([score])[0]}</span></div>", unsafe_allow_html=True)
+
+    if ready("fund") and once("valuation") and fund_data:
+        vp = fund_data
+        valuation_html = f"""
+            <div style='background-color:#e3f2fd; padding:10px; border-radius:10px; text-align:center; color:#0d47a1;'>
+                便宜價: <b>{vp['便宜價']}</b> ◀ 現價: <b>{data['現價']}</b> ▶ 昂貴價: <b>{vp['昂貴價']}</b>
+                <br><small>(估價模型: {vp['估價法']})</small>
+            </div>
+        """
+        ph["valuation"].markdown(valuation_html, unsafe_allow_html=True)
+
+    if once("chart"): ph["chart"].plotly_chart(plot_chart(data), use_container_width=True)
 
 # --- 主程式介面 ---
 st.sidebar.header("🦅 V20.0 籌碼強力抓取版")
-strategy_mode = st.sidebar.radio("🎯 選擇策略", ("🚀 短線噴射 (飆股)", "🌊 波段成長 (趨勢)", "💎 長線價值 (低接)"), index=1)
+strategy_mode = st.sidebar.radio("🎯 選擇策略", tuple(STRATEGIES), index=1)
 all_sectors = list(STOCK_DB.keys())
 selected_sectors = st.sidebar.multiselect("板塊篩選", all_sectors, default=all_sectors)
 strict_mode = st.sidebar.checkbox("嚴格篩選模式", value=False)
+mtf_rule = st.sidebar.selectbox("🧭 多週期確認", ["不使用", *MTF_RULES])
+live_mode = st.sidebar.toggle("⏱️ 盤中每分鐘即時更新", value=False)
+with st.sidebar.expander("🗄️ 快取狀態"):
+    stats = cache_stats()
+    if stats: st.dataframe(pd.DataFrame(stats).set_index("類別"), use_container_width=True)
+    else: st.caption("尚無快取資料")
+debug_mode = st.sidebar.toggle("🐞 效能除錯面板", value=False)
+mem_box = st.sidebar.empty() # 整頁跑完才知道本 session 的大小，最後再填
+debug_box = st.sidebar.empty() # 同上：本次 rerun 各階段耗時最後再填
 
 st.title("🦅 台股 AI 戰情室 V20.0")
 rate, delta = get_macro_data()
 st.metric("🇺🇸 美國 10 年期公債殖利率", f"{rate:.2f}%", f"{delta:.2f}", delta_color="inverse")
 
-if 'scan_result_v20' not in st.session_state: st.session_state.scan_result_v20 = None
+if 'scan_v20' not in st.session_state: st.session_state.scan_v20 = None
+scan_list = []
+for sector in selected_sectors: scan_list.extend(list(STOCK_DB[sector].keys()))
+
+# --- 背景掃描快照 (scan_worker.py 產生)：尚未手動掃描時直接讀最新一份，有新快照或換板塊就重新套用 ---
+if st.session_state.get('scan_source_v20') in (None, "snapshot"):
+    snapshot = load_latest_snapshot()
+    if snapshot is not None and st.session_state.get('snapshot_key_v20') != (snapshot["created"], tuple(selected_sectors)):
+        st.session_state.scan_v20 = subset_scan(snapshot["scan"], scan_list)
+        st.session_state.scan_list_v20 = scan_list; st.session_state.scan_source_v20 = "snapshot"
+        st.session_state.snapshot_key_v20 = (snapshot["created"], tuple(selected_sectors))
+
+# --- Tabs (先建立分頁，掃描中的結果才能逐批畫進 tab1；掃描訊息放在分頁上方) ---
+notice = st.container()
+tab1, tab2, tab3, tab4 = st.tabs(["📋 篩選結果", "🔍 12大指標深度透視", "📈 策略回測", "🧭 板塊連動"])
 
 if st.sidebar.button("🚀 執行全市場掃描", type="primary"):
-    scan_list = []
-    for sector in selected_sectors: scan_list.extend(list(STOCK_DB[sector].keys()))
-    total = len(scan_list); bar = st.progress(0); res = []
+    store = get_provider()
+    if isinstance(store, OHLCVStore): store.maybe_compact(list(FLAT_STOCK_DB) + list(BENCHMARKS)) # 每日一次清掉已移出 STOCK_DB 的代號
+    total = len(set(scan_list)); bar = notice.progress(0)
     st.toast(f"掃描 {total} 檔個股中...", icon="🦅")
-    for i, t in enumerate(scan_list):
-        d = analyze_stock_strategy(t, strategy_mode, strict_mode, bypass_filter=False)
-        if d: res.append(d)
-        bar.progress((i+1)/total)
-    bar.empty()
-    if res:
-        st.session_state.scan_result_v20 = pd.DataFrame(res).sort_values(by="總分", ascending=False)
-        st.success(f"掃描完成！找到 {len(res)} 檔符合策略個股。")
-    else: st.warning("無符合標的，請嘗試關閉嚴格模式。")
-
-# --- Tabs ---
-tab1, tab2 = st.tabs(["📋 篩選結果", "🔍 12大指標深度透視"])
+    # 分段：初篩 (近 5 根 K 棒的價格 / 成交金額，佔進度 30%) -> 留下的分批抓半年行情、算指標評分，每批完成就更新 tab1
+    def on_progress(stage, done, n, rate):
+        if not n: return # 沒選任何板塊：初篩回報 0/0
+        frac = 0.3 * done / n if stage == "初篩" else 0.3 + 0.7 * done / n
+        bar.progress(min(frac, 1.0), text=f"{stage} {done}/{n}｜{rate:,.0f} 檔/秒")
+    with tab1: partial_table = st.empty()
+    scan = None
+    with stage("掃描/總計"):
+        for scan in staged_scan(scan_list, progress=on_progress):
+            partial = rank_results(scan, strategy_mode, strict_mode)
+            if len(partial): show_results(partial_table, partial, strategy_mode)
+    partial_table.empty(); bar.empty()
+    st.session_state.scan_v20 = scan
+    st.session_state.scan_list_v20 = list(scan["snap"].index) if scan else []; st.session_state.scan_source_v20 = "manual"
+    res = rank_results(scan, strategy_mode, strict_mode) if scan else None
+    if res is not None and len(res):
+        get_crawler().prewarm_async(res['代號'].tolist()) # 背景預抓入選個股的大戶籌碼
+        notice.success(f"掃描完成！{total} 檔初篩後分析 {len(scan['snap'])} 檔，找到 {len(res)} 檔符合策略個股。")
+    else: notice.warning("無符合標的，請嘗試關閉嚴格模式。")
+
+# --- 盤中即時更新 (每 60 秒重跑一次，只用最新 K 棒更新指標) ---
+if live_mode and st.session_state.get('scan_list_v20'):
+    @st.fragment(run_every=60)
+    def live_refresh():
+        if time.time() - st.session_state.get('live_ts_v20', 0) >= 55:
+            st.session_state.live_ts_v20 = time.time()
+            st.session_state.scan_v20 = live_scan(st.session_state.scan_list_v20); st.session_state.scan_source_v20 = "live"
+            st.rerun()
+        st.caption(f"🟢 即時更新中｜最後更新 {time.strftime('%H:%M:%S', time.localtime(st.session_state.live_ts_v20))}")
+    with notice: live_refresh()
+
+if st.session_state.get('scan_source_v20') == "snapshot":
+    notice.caption(f"📦 背景掃描快照 {st.session_state.snapshot_key_v20[0]:%Y-%m-%d %H:%M}｜如需最新盤勢請按「執行全市場掃描」")
+
+# 全策略評分已快取：切換策略 / 嚴格模式只重新排序
+ranked = rank_results(st.session_state.scan_v20, strategy_mode, strict_mode) if st.session_state.scan_v20 else None
+if ranked is not None and len(ranked) and mtf_rule != "不使用":
+    # 只對入選結果讀較長的日 K (本地資料庫) 重新取樣成週 / 月線確認，不另外下載各週期
+    with stage("多週期/確認"):
+        mtf = mtf_scan(ranked['代號'].tolist(), rule_timeframes(mtf_rule))
+        ok = ranked['代號'].map(confirm(mtf, mtf_rule)['確認']) if mtf else None
+    ranked = ranked[ok.fillna(False).to_numpy(dtype=bool)].reset_index(drop=True) if ok is not None else ranked.iloc[:0]
+results = ranked if ranked is not None and len(ranked) else None # 每次 rerun 由精簡的 scan_v20 重建，不放進 session_state
 
 with tab1:
-    if st.session_state.scan_result_v20 is not None:
-        df = st.session_state.scan_result_v20
-        def style_rows(row):
-            if "強力" in row['建議']: return ['background-color: #ffebee; color: #c62828; font-weight: bold']*len(row)
-            return ['background-color: #f1f8e9; color: #33691e']*len(row)
-        cols = ["代號", "名稱", "現價", "漲跌幅%", "總分", "主力成本", "建議", "訊號"]
-        if strategy_mode == "🚀 短線噴射 (飆股)": cols.insert(6, "布林型態")
-        display_df = df.copy(); display_df['訊號'] = display_df['訊號'].apply(lambda x: ", ".join(x))
-        st.dataframe(
-            display_df[cols].style.apply(style_rows, axis=1).format("{:.2f}", subset=["現價", "漲跌幅%", "總分", "主力成本"]), 
-            use_container_width=True, height=600,
-            column_config={"大戶籌碼連結": st.column_config.LinkColumn("集保籌碼", display_text="查看")}
-        )
+    if results is not None:
+        show_results(st, results, strategy_mode)
     else: st.info("👈 請點擊「執行全市場掃描」。")
 
 with tab2:
     c_search, c_or, c_sel = st.columns([3, 0.5, 3])
     with c_search: search_ticker = st.text_input("🔍 輸入任意代號 (如 2330)", "")
     with c_sel: 
-        opts = ["請選擇..."] + ((st.session_state.scan_result_v20['代號'] + " - " + st.session_state.scan_result_v20['名稱']).tolist() if st.session_state.scan_result_v20 is not None else [])
+        opts = ["請選擇..."] + ((results['代號'] + " - " + results['名稱']).tolist() if results is not None else [])
         sel_opt = st.selectbox("或從結果選擇:", opts)
 
     target = None
@@ -313,74 +321,78 @@ with tab2:
     elif sel_opt != "請選擇...": target = sel_opt.split(" - ")[0]
 
     if target:
-        with st.spinner(f"正在分析 {target} 並爬取大戶籌碼 (需2-3秒)..."):
-            data = analyze_stock_strategy(target, strategy_mode, strict_mode, bypass_filter=True)
-            if data:
-                if data['名稱'] == target: data['名稱'] = get_name_online(target)
-                fund_data = None; corr_data = (0, "N/A"); chip_data = None
-                if "00" not in target[:2]: 
-                    fund_data = get_advanced_fundamentals(target); corr_data = calculate_correlation(target)
-                    chip_data = get_chip_data_histock(target) # V20 執行爬蟲
-
-                st.markdown("---")
-                st.subheader(f"📊 {data['名稱']} ({target}) 12指標戰情牆")
-                if data['狀態']: st.warning(f"💡 提示：此股票目前 {data['狀態']}，但我們已為您強制輸出分析報告。")
-
-                with st.container():
-                    g1, g2, g3 = st.columns(3)
-                    with g1: st.plotly_chart(plot_gauge(data['總分'], f"{strategy_mode} 評分"), use_container_width=True)
-                    with g2: st.plotly_chart(plot_gauge(data['RSI'], "RSI 動能"), use_container_width=True)
-                    with g3: st.plotly_chart(plot_gauge(data['MFI'], "MFI 資金流"), use_container_width=True)
-
-                st.markdown("### 🦅 12 大關鍵指標透視")
-                m1, m2, m3, m4 = st.columns(4)
-                if fund_data:
-                    m1.markdown(f"<div class='indicator-box'>EPS / 營收<br><br><span style='font-size:1.5em'>{fund_data['EPS(預估)']} / {fund_data['營收成長']}</span></div>", unsafe_allow_html=True)
-                    m2.markdown(f"<div class='indicator-box'>本益比 (P/E)<br><br><span style='font-size:1.5em'>{fund_data['本益比']}</span></div>", unsafe_allow_html=True)
-                    m3.markdown(f"<div class='indicator-box'>股價淨值比<br><br><span style='font-size:1.5em'>{fund_data['股價淨值比']}</span></div>", unsafe_allow_html=True)
-                    
-                    # [V20 修改] 優先顯示 400 張大戶 (自動爬取)
-                    if chip_data:
-                        val = chip_data['400張']; diff = chip_data['400張增減']
-                        color = "red" if diff > 0 else "green" if diff < 0 else "black"
-                        symbol = "▲" if diff > 0 else "▼" if diff < 0 else ""
-                        m4.markdown(f"<div class='chip-box-success'>👑 400張大戶<br><br><span style='font-size:1.5em; color:{color}'>{val}% {symbol}</span></div>", unsafe_allow_html=True)
-                    else:
-                        m4.markdown(f"<div class='indicator-box'>內部人持股<br><br><span style='font-size:1.5em'>{fund_data['內部人持股']}</span></div>", unsafe_allow_html=True)
-                
-                st.markdown("")
-                t1, t2, t3, t4 = st.columns(4)
-                t1.markdown(f"<div class='indicator-box'>MACD 趨勢<br><br><span style='font-size:1.5em'>{data['MACD']}</span></div>", unsafe_allow_html=True)
-                t2.markdown(f"<div class='indicator-box'>均線乖離率<br><br><span style='font-size:1.5em'>{data['乖離率']}%</span></div>", unsafe_allow_html=True)
-                t3.markdown(f"<div class='indicator-box'>大戶成本<br><br><span style='font-size:1.5em'>{data['主力成本']:.2f}</span></div>", unsafe_allow_html=True)
-                
-                # [V20 修改] 優先顯示 1000 張大戶 (自動爬取)
-                if chip_data:
-                    val = chip_data['1000張']; diff = chip_data['1000張增減']
-                    color = "red" if diff > 0 else "green" if diff < 0 else "black"
-                    symbol = "▲" if diff > 0 else "▼" if diff < 0 else ""
-                    t4.markdown(f"<div class='chip-box-success'>👑 1000張大戶<br><br><span style='font-size:1.5em; color:{color}'>{val}% {symbol}</span></div>", unsafe_allow_html=True)
-                else:
-                    # 讀取失敗時顯示按鈕
-                    t4.link_button("⚠️ 籌碼讀取失敗 (請點此查看)", data['大戶籌碼連結'], use_container_width=True)
-
-                st.markdown("")
-                o1, o2, o3, o4 = st.columns(4)
-                o1.markdown(f"<div class='indicator-box'>美股連動 ({corr_data[1]})<br><br><span style='font-size:1.5em'>{corr_data[0]:.2f}</span></div>", unsafe_allow_html=True)
-                o2.markdown(f"<div class='indicator-box'>Fed 利率環境<br><br><span style='font-size:1.5em'>{rate:.2f}%</span></div>", unsafe_allow_html=True)
-                cl_t = target.replace(".TW", "").replace(".TWO", "")
-                with o3: st.link_button("📊 查看信用交易 (Yahoo)", f"https://tw.stock.yahoo.com/quote/{cl_t}/margin-trading", use_container_width=True)
-                with o4: st.link_button("⚖️ 查看法人買賣 (Goodinfo)", f"https://goodinfo.tw/tw/StockDetail.asp?STOCK_ID={cl_t}", use_container_width=True)
-
-                if fund_data:
-                    vp = fund_data
-                    valuation_html = f"""
-                        <div style='background-color:#e3f2fd; padding:10px; border-radius:10px; text-align:center; color:#0d47a1;'>
-                            便宜價: <b>{vp['便宜價']}</b> ◀ 現價: <b>{data['現價']}</b> ▶ 昂貴價: <b>{vp['昂貴價']}</b>
-                            <br><small>(估價模型: {vp['估價法']})</small>
-                        </div>
-                    """
-                    st.markdown(valuation_html, unsafe_allow_html=True)
-
-                st.plotly_chart(plot_chart(data), use_container_width=True)
-            else: st.error("查無資料，請確認代號正確。")
+        # 各資料來源並行抓取，共用一個延遲預算；誰先回來先畫誰，逾時的區塊走原本的連結按鈕
+        # 評分 (半年)、多週期 (日 / 週 / 月線重新取樣) 與連動係數共用同一次抓取的最長日 K，不各自下載
+        base = once(lambda: fetch_base([target], DEEP_TIMEFRAMES).get(target))
+        def deep_data():
+            df = base()
+            return None if df is None else analyze_stock_strategy(target, strategy_mode, strict_mode, bypass_filter=True, df=trim_period(df, HISTORY_PERIOD))
+        tasks = {"data": deep_data, "mtf": lambda: mtf_scan([target], DEEP_TIMEFRAMES, frames={target: base()})}
+        if target not in FLAT_STOCK_DB: tasks["name"] = lambda: get_name_online(target)
+        if "00" not in target[:2]:
+            tasks["fund"] = lambda: get_advanced_fundamentals(target); tasks["corr"] = lambda: calculate_correlation(target, df=base())
+            tasks["chip"] = lambda: get_chip_data_histock(target) # V20 執行爬蟲
+        status = st.empty(); status.info(f"⏳ 正在並行分析 {target} 並爬取大戶籌碼...")
+        ph = {k: st.empty() for k in ("header", "gauge", "fund_row", "tech_row", "macro_row", "mtf_row", "valuation", "chart")}
+        got = {}; drawn = set()
+        def on_result(name, value, timed_out):
+            got[name] = value
+            render_deep_dive(target, tasks, got, ph, drawn)
+        with stage("深度透視/總計"): late = run_with_budget(tasks, on_result)
+        if "data" in late: status.empty(); st.warning(f"⏱️ {target} 行情讀取逾時 (背景繼續下載)，請稍後重新選取。")
+        elif got.get("data") is None: status.empty(); st.error("查無資料，請確認代號正確。")
+        elif late: status.caption(f"⏱️ 逾時略過：{', '.join(late)} (背景繼續抓取，重新選取即可顯示)")
+        else: status.empty()
+
+with tab3:
+    # 以本地資料庫的多年日 K 重跑全部策略，比較各門檻 / 建議分級的事後報酬
+    c_years, c_run = st.columns([3, 1])
+    with c_years: bt_years = st.slider("回測年數", 1, 10, 5)
+    with c_run: run_bt = st.button("▶️ 執行回測", use_container_width=True)
+    if run_bt:
+        from backtest import run_backtest, load_frames
+        bar = st.progress(0)
+        frames = load_frames(scan_list, bt_years)
+        st.session_state.backtest_v20 = (bt_years, run_backtest(frames, progress=lambda done, n: bar.progress(done/n, text=f"回測 {done}/{n}")))
+        bar.empty()
+    if st.session_state.get('backtest_v20') is not None:
+        years, bt = st.session_state.backtest_v20
+        view = bt[bt["策略"] == strategy_mode].drop(columns="策略")
+        horizon = st.radio("持有天數", sorted(view["持有天數"].unique()), horizontal=True, format_func=lambda h: f"{h} 日")
+        st.caption(f"近 {years} 年｜訊號日收盤進場、持有 {horizon} 日後收盤出場；組合為每 {horizon} 日換股、入選個股等權")
+        st.dataframe(view[view["持有天數"] == horizon].drop(columns="持有天數").set_index("條件").style.format("{:.2f}", subset=["勝率%", "平均報酬%", "平均MAE%", "組合報酬%", "組合最大回撤%", "超額報酬%"], na_rep="-"),
+                     use_container_width=True, height=560)
+    else: st.info("選擇年數後點擊「執行回測」(首次需下載多年日 K，之後從本地資料庫增量更新)。")
+
+with tab4:
+    # 板塊 × 板塊平均兩兩相關 (報酬率)；當日相關係數表已算好就直接畫，否則按鈕觸發
+    corr_table = get_correlations(compute=False)
+    if corr_table is None and st.button("🧮 計算今日相關係數", use_container_width=True):
+        with st.spinner("計算全市場相關係數中 (首次需下載一年日 K)..."): corr_table = get_correlations()
+    if corr_table is not None:
+        import plotly.graph_objects as go
+        window = st.radio("視窗", WINDOWS, index=WINDOWS.index(DEFAULT_WINDOW), horizontal=True, format_func=lambda w: f"{w} 日")
+        heat = corr_table.sector_frame(window)
+        with stage("圖表/板塊熱圖"):
+            fig = go.Figure(go.Heatmap(z=heat.values, x=heat.columns, y=heat.index, zmin=-1, zmax=1, colorscale="RdBu_r", text=heat.round(2).values, texttemplate="%{text}"))
+            fig.update_layout(height=max(500, 28 * len(heat)), margin=dict(l=10, r=10, t=30, b=10), yaxis_autorange="reversed")
+        st.caption(f"資料截至 {corr_table.asof:%Y-%m-%d}｜{len(corr_table.tickers)} 檔｜對角線為板塊內平均兩兩相關")
+        st.plotly_chart(fig, use_container_width=True)
+        st.markdown("**各板塊對指數的平均連動**")
+        st.dataframe(corr_table.benchmark_by_sector(window).style.format("{:.2f}"), use_container_width=True)
+    else: st.info("尚未計算今日的相關係數 (背景掃描程式會順便預先算好)。")
+
+# --- 本 session 記憶體用量 (session_state 內容；峰值跨 rerun 保留) ---
+mem_now, mem_peak = session_memory(st.session_state, "mem_peak_v20"); rss = process_peak_rss()
+mem_box.caption(f"🧠 本 session {mem_now/2**20:.2f} MB｜峰值 {mem_peak/2**20:.2f} MB" + (f"｜process 峰值 {rss/2**20:.0f} MB" if rss else ""))
+
+# --- 效能除錯面板：各階段累計耗時 / 計數 (process 層級，見 profiling.py)，可匯出 JSON 供版本間比較 ---
+if debug_mode:
+    with debug_box.container():
+        rows = STATS.rows()
+        if rows: st.dataframe(pd.DataFrame(rows).set_index("階段"), use_container_width=True)
+        else: st.caption("尚無量測資料")
+        counters = STATS.counters()
+        if counters: st.caption("｜".join(f"{k} {v:,}" for k, v in counters.items()))
+        st.download_button("📥 匯出 JSON", STATS.to_json(), file_name=f"profile-{time.strftime('%Y%m%d-%H%M%S')}.json", mime="application/json", use_container_width=True)
+        if st.button("🧹 重設計時", use_container_width=True): STATS.reset(); st.rerun()
@@ -0,0 +1,112 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from data_provider import get_provider, SyntheticProvider, synthetic_universe
+from indicators import Panel, compute_indicators, _shift
+from strategies import COMPILED, ACTION_LEVELS, DEFAULT_ACTION, derive_fields
+
+# --- 向量化回測：整段歷史 (日期 × 個股) 一次評分，不逐日迴圈 ---
+# 每個 (策略, 篩選參數, 持有天數) 以 bincount 依「日期 × 總分」累加報酬，
+# 任何總分門檻只是對總分軸取後綴和，所以掃描門檻幾乎不花額外時間
+HORIZONS = (5, 20, 60)
+MIN_SCORE_GRID = tuple(range(30, 100, 10))
+MIN_BARS = 60 # 與掃描相同：至少 60 根 K 棒才評分
+MAX_SCORE = 100
+
+def panel_fields(panel, ind):
+    f = {"Open": panel.open, "High": panel.high, "Low": panel.low, "Close": panel.close, "Volume": panel.volume, **ind}
+    f["Prev_Close"] = _shift(panel.close); f["Prev_MACD_Hist"] = _shift(ind["MACD_Hist"])
+    return derive_fields(f)
+
+def forward_returns(panel, h):
+    # 訊號日收盤進場、h 日後收盤出場的報酬，以及持有期間最低價的最大不利幅度 (MAE)
+    c = panel.close; fwd = np.full_like(c, np.nan); mae = np.full_like(c, np.nan)
+    lows = pd.DataFrame(panel.low).rolling(h, min_periods=h).min().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fwd[:-h] = c[h:] / c[:-h] - 1; mae[:-h] = lows[h:] / c[:-h] - 1
+    return fwd, mae
+
+class _Acc:
+    # 一組篩選條件、全部持有天數共用的累加器：筆數 / 報酬和為 (持有天數 × 日期 × 總分) (組合報酬要逐日)，
+    # 上漲筆數 / MAE 和只用到總計，存 (持有天數 × 總分) 即可；rows 為每格對應的共用日期軸列號
+    def __init__(self, T, horizons):
+        H = len(horizons); self.T = T
+        self.n = np.zeros((H, T, MAX_SCORE + 1), dtype=np.int32); self.ret = np.zeros((H, T, MAX_SCORE + 1))
+        self.hit = np.zeros((H, MAX_SCORE + 1), dtype=np.int64); self.mae = np.zeros((H, MAX_SCORE + 1))
+
+    def add(self, k, mask, score, fwd, mae, rows):
+        m = mask & ~np.isnan(fwd) & (rows >= 0); s = np.clip(score, 0, MAX_SCORE)[m]
+        key = rows[m] * (MAX_SCORE + 1) + s; size = self.T * (MAX_SCORE + 1); shape = self.n.shape[1:]
+        self.n[k] += np.bincount(key, minlength=size).reshape(shape).astype(np.int32)
+        self.ret[k] += np.bincount(key, weights=fwd[m], minlength=size).reshape(shape)
+        self.hit[k] += np.bincount(s[fwd[m] > 0], minlength=MAX_SCORE + 1)
+        self.mae[k] += np.bincount(s, weights=mae[m], minlength=MAX_SCORE + 1)
+
+    def summary(self, k, lo, hi, h):
+        sl = slice(lo, hi + 1); n_t = self.n[k][:, sl].sum(axis=1); r_t = self.ret[k][:, sl].sum(axis=1); n = n_t.sum()
+        # 組合：每 h 日換股一次、入選個股等權，未入選的日子空手
+        step = np.where(n_t[::h] > 0, r_t[::h] / np.maximum(n_t[::h], 1), 0.0)
+        equity = np.cumprod(1 + step); dd = float((equity / np.maximum.accumulate(equity) - 1).min()) if len(equity) else 0.0
+        return {"訊號數": int(n), "勝率%": self.hit[k][sl].sum() / n * 100 if n else np.nan,
+                "平均報酬%": r_t.sum() / n * 100 if n else np.nan, "平均MAE%": self.mae[k][sl].sum() / n * 100 if n else np.nan,
+                "組合報酬%": (equity[-1] - 1) * 100 if len(equity) else 0.0, "組合最大回撤%": dd * 100}
+
+def run_backtest(frames, horizons=HORIZONS, grid=MIN_SCORE_GRID, chunk=250, progress=None):
+    frames = {t: df for t, df in frames.items() if df is not None and len(df) > MIN_BARS}
+    calendar = pd.DatetimeIndex(sorted(set().union(*(df.index for df in frames.values()))))
+    T = len(calendar); tickers = list(frames)
+    # 篩選參數組：各策略的寬鬆 / 嚴格門檻，外加「不篩選」用來算建議分級與全體基準
+    accs = {(name, key): _Acc(T, horizons) for name in COMPILED for key in ("寬鬆", "嚴格", "全部")}
+    for i in range(0, len(tickers), chunk):
+        part = {t: frames[t] for t in tickers[i:i+chunk]}
+        # 指標與持有報酬都用各檔自己的 K 棒計算 (與掃描相同，停牌缺日不會讓均線斷掉)，累加時再依日期對到共用日期軸
+        panel = Panel.from_frames(part); ind = compute_indicators(panel); f = panel_fields(panel, ind)
+        rows = calendar.get_indexer(pd.DatetimeIndex(panel.dates.ravel())).reshape(panel.dates.shape) # 補齊的空格為 -1
+        valid = (np.cumsum(~np.isnan(panel.close), axis=0) >= MIN_BARS) & ~np.isnan(panel.close)
+        fwds = {h: forward_returns(panel, h) for h in horizons}
+        for name, s in COMPILED.items():
+            score, _ = s.score(f)
+            masks = {"寬鬆": valid & s.select(f, s.thresholds[False]), "嚴格": valid & s.select(f, s.thresholds[True]), "全部": valid}
+            for key, mask in masks.items():
+                for k, h in enumerate(horizons): accs[(name, key)].add(k, mask, score, *fwds[h], rows)
+        if progress: progress(min(i + chunk, len(tickers)), len(tickers))
+
+    rows = []
+    for name, s in COMPILED.items():
+        loose, strict = s.thresholds[False]["min_score"], s.thresholds[True]["min_score"]
+        levels = [lv for lv, _ in ACTION_LEVELS]
+        variants = [("寬鬆", f"寬鬆 (總分≥{loose})", loose, MAX_SCORE), ("嚴格", f"嚴格 (總分≥{strict})", strict, MAX_SCORE)]
+        variants += [("寬鬆", f"門檻 總分≥{m}", m, MAX_SCORE) for m in grid]
+        bounds = [MAX_SCORE + 1] + levels
+        variants += [("全部", f"建議 {label}", lo, hi - 1) for (lo, label), hi in zip(ACTION_LEVELS, bounds)]
+        variants += [("全部", f"建議 {DEFAULT_ACTION}", 0, levels[-1] - 1), ("全部", "基準 (全部個股日)", 0, MAX_SCORE)]
+        for k, h in enumerate(horizons):
+            base = accs[(name, "全部")].summary(k, 0, MAX_SCORE, h)["平均報酬%"]
+            for key, label, lo, hi in variants:
+                stats = accs[(name, key)].summary(k, lo, hi, h)
+                rows.append({"策略": name, "條件": label, "持有天數": h, **stats, "超額報酬%": stats["平均報酬%"] - base})
+    return pd.DataFrame(rows)
+
+def load_frames(tickers, years, provider=None):
+    return (provider or get_provider()).fetch(list(tickers), period=f"{years}y")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="策略回測 (本地資料庫或合成資料)")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--synthetic", type=int, default=0, help="改用 N 檔合成個股 (不需網路)")
+    parser.add_argument("--chunk", type=int, default=250)
+    parser.add_argument("--out", help="結果另存 CSV")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    if args.synthetic: frames = load_frames(synthetic_universe(args.synthetic), args.years, SyntheticProvider(days=args.years * 252))
+    else:
+        from stock_db import FLAT_STOCK_DB
+        frames = load_frames(FLAT_STOCK_DB, args.years)
+    t1 = time.perf_counter()
+    result = run_backtest(frames, chunk=args.chunk)
+    t2 = time.perf_counter()
+    pd.set_option("display.width", 200); pd.set_option("display.max_rows", 500)
+    print(result.round(2).to_string(index=False))
+    print(f"\n{len(frames)} 檔 × {args.years} 年：載入 {t1 - t0:.1f}s，回測 {t2 - t1:.1f}s")
+    if args.out: result.to_csv(args.out, index=False, encoding="utf-8-sig")
@@ -0,0 +1,125 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import numpy as np
+import pandas as pd
+from cache import get_cache
+from data_provider import SyntheticProvider, set_provider, synthetic_universe
+from indicators import add_indicators
+from analysis import staged_scan, rank_results, analyze_stock_strategy
+from timeframes import mtf_scan
+from strategies import STRATEGIES
+from scan_store import footprint, load_history
+from profiling import STATS
+
+# --- 離線效能基準：全部用合成行情 (固定結束日與亂數種子，不需網路)，結果可存成 JSON 與前一版比較 ---
+# 用法：python bench.py [--quick] [--out bench.json] [--compare 上一版.json] [--threshold 0.1]
+END = pd.Timestamp("2025-12-31") # 固定日期：每次跑的資料完全相同
+SCAN_SIZES = (100, 1000, 5000)
+SCAN_DAYS = 130 # 掃描抓半年日 K
+DEEP_DAYS = 1600 # 深度透視含月線 (多週期需 6 年)
+CHART_YEARS = 10
+STRATEGY = list(STRATEGIES)[1] # 與介面預設策略相同
+
+def _version():
+    try: return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception: return "unknown"
+
+def _cold():
+    # 每次量測前清掉共用快取，量到的是沒有快取命中的成本
+    for name in ("history", "timeframe"): get_cache(name).invalidate()
+
+def _timeit(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        _cold(); t0 = time.perf_counter(); out = fn(); times.append(time.perf_counter() - t0)
+    return np.array(times), out
+
+def _stages():
+    return {r["階段"]: r["總秒數"] for r in STATS.rows()}
+
+def bench_scan(n, repeat):
+    # 掃描吞吐量：初篩 -> 分批抓取 -> 指標 -> 評分，含合成資料產生 (代替下載)；另記每筆結果的記憶體
+    set_provider(SyntheticProvider(days=SCAN_DAYS, end=END)); tickers = synthetic_universe(n)
+    def run():
+        scan = None
+        for scan in staged_scan(tickers): pass
+        return scan
+    STATS.reset(); times, scan = _timeit(run, repeat)
+    rows = len(scan["snap"]); ranked = rank_results(scan, STRATEGY, False, bypass_filter=True)
+    return {"tickers": n, "results": rows, "median_s": float(np.median(times)), "best_s": float(times.min()),
+            "tickers_per_s": n / float(np.median(times)),
+            "bytes_per_result": footprint(scan) / max(rows, 1), "bytes_per_ranked_row": footprint(ranked) / max(len(ranked), 1),
+            "stages_s": {k: v / repeat for k, v in _stages().items()}}
+
+def bench_deep_dive(samples):
+    # 深度透視延遲：單檔評分 + 日/週/月多週期 + 指標歷史 (不含基本面 / 籌碼等網路來源)
+    set_provider(SyntheticProvider(days=DEEP_DAYS, end=END)); STATS.reset(); times = []
+    for t in synthetic_universe(samples, prefix="D"):
+        _cold(); t0 = time.perf_counter()
+        data = analyze_stock_strategy(t, STRATEGY, False, bypass_filter=True); mtf_scan([t]); load_history(t)
+        times.append(time.perf_counter() - t0)
+        if data is None: raise RuntimeError(f"deep dive returned no data for {t}")
+    ms = np.array(times) * 1000
+    return {"samples": samples, "median_ms": float(np.median(ms)), "p95_ms": float(np.percentile(ms, 95)), "max_ms": float(ms.max()),
+            "bytes_per_history": footprint(load_history(t)), "stages_s": {k: v / samples for k, v in _stages().items()}}
+
+def bench_chart(repeat, years=CHART_YEARS):
+    # K 線圖建構時間 (長歷史)；只量 Plotly figure 的建立，不含瀏覽器端繪製
+    from charts import plot_chart
+    from data_provider import synthetic_ohlcv
+    df = add_indicators(synthetic_ohlcv("C0000.TW", years * 252, END)).astype(np.float32)
+    data = {"名稱": "合成", "代號": "C0000.TW", "History": df}
+    plot_chart(data) # 第一次含 plotly 載入，不計
+    times, _ = _timeit(lambda: plot_chart(data), repeat); ms = times * 1000
+    return {"bars": len(df), "median_ms": float(np.median(ms)), "best_ms": float(ms.min())}
+
+def run_all(quick=False):
+    sizes = SCAN_SIZES[:2] if quick else SCAN_SIZES; repeat = 1 if quick else 3
+    cases = {}
+    for n in sizes:
+        cases[f"scan_{n}"] = bench_scan(n, repeat); print(f"掃描 {n} 檔：{cases[f'scan_{n}']['median_s']:.2f}s")
+    cases["deep_dive"] = bench_deep_dive(10 if quick else 30); print(f"深度透視：中位數 {cases['deep_dive']['median_ms']:.0f}ms")
+    cases["chart_10y"] = bench_chart(2 if quick else 5); print(f"K 線圖 {CHART_YEARS} 年：中位數 {cases['chart_10y']['median_ms']:.0f}ms")
+    return {"version": _version(), "created": pd.Timestamp.now().isoformat(timespec="seconds"), "quick": quick,
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__, "cases": cases}
+
+def compare(result, baseline, threshold=0.1):
+    # 逐項比較數值指標：*_per_s 越大越好，其餘 (秒數 / 毫秒 / 位元組) 越小越好；變差超過 threshold 標記為退步
+    rows = []
+    for case, metrics in result["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        if base is None: continue
+        for key, value in metrics.items():
+            old = base.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or key in ("tickers", "results", "samples", "bars") or not old: continue
+            change = value / old - 1; worse = -change if key.endswith("_per_s") else change
+            rows.append({"項目": case, "指標": key, "基準": old, "本次": value, "變化%": change * 100, "退步": worse > threshold})
+    return pd.DataFrame(rows, columns=["項目", "指標", "基準", "本次", "變化%", "退步"])
+
+def main():
+    parser = argparse.ArgumentParser(description="離線效能基準 (合成行情，不需網路)")
+    parser.add_argument("--quick", action="store_true", help="只跑 100 / 1,000 檔且不重複，快速檢查用")
+    parser.add_argument("--out", help="結果另存 JSON (含版本)，之後可用 --compare 比較")
+    parser.add_argument("--compare", help="與先前存下的 JSON 比較")
+    parser.add_argument("--threshold", type=float, default=0.1, help="變差超過此比例視為退步 (預設 10%%)")
+    args = parser.parse_args()
+    result = run_all(args.quick)
+    pd.set_option("display.width", 200); pd.set_option("display.max_rows", 200)
+    flat = pd.DataFrame({case: {k: v for k, v in m.items() if k != "stages_s"} for case, m in result["cases"].items()}).T
+    print(f"\n版本 {result['version']}\n{flat.round(2).to_string()}")
+    for case, m in result["cases"].items():
+        if m.get("stages_s"): print(f"\n{case} 各階段 (秒/次)：" + "｜".join(f"{k} {v:.3f}" for k, v in sorted(m["stages_s"].items(), key=lambda kv: -kv[1])))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: baseline = json.load(f)
+        if baseline.get("quick") != result["quick"]: print("\n注意：--quick 與完整模式的重複次數 / 樣本數不同，延遲分位數僅供參考")
+        table = compare(result, baseline, args.threshold)
+        print(f"\n與 {baseline.get('version', args.compare)} 比較：\n{table.round(2).to_string(index=False)}")
+        if table["退步"].any(): raise SystemExit(f"{int(table['退步'].sum())} 項指標退步超過 {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
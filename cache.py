@@ -0,0 +1,130 @@
+import atexit
+import functools
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# --- 全域快取層：依資料類別各自設定 TTL / 容量，可寫入磁碟跨重啟保留 ---
+# (ttl 秒, 最大筆數, 過期後仍可先回傳舊值的寬限秒數)
+CACHE_POLICY = {
+    "quote": (60, 512, 300),
+    "fundamentals": (6 * 3600, 2048, 24 * 3600),
+    "name": (86400, 4096, 7 * 86400),
+    "chip": (7 * 86400, 4096, 0),
+    "history": (60, 256, 0),
+    "timeframe": (600, 4096, 0),
+}
+# 可由本地行情資料庫重建的類別只放記憶體，不寫磁碟
+MEMORY_ONLY = {"history", "timeframe"}
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+class TTLCache:
+    def __init__(self, name, ttl, maxsize, stale=0, persist=False, save_every=10):
+        self.name = name; self.ttl = ttl; self.maxsize = maxsize; self.stale = stale
+        self.path = os.path.join(CACHE_DIR, f"cache_{name}.pkl") if persist else None
+        self.save_every = save_every; self._saved_at = 0.0; self._dirty = False
+        self._data = OrderedDict(); self._lock = threading.RLock(); self._refreshing = set()
+        self.hits = self.misses = self.stale_hits = self.evictions = self.refreshes = 0
+        if self.path: self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f: data = pickle.load(f)
+            now = time.time()
+            self._data = OrderedDict((k, v) for k, v in data.items() if now - v[0] < self.ttl + self.stale)
+        except Exception: self._data = OrderedDict()
+
+    def save(self, force=False):
+        if not self.path or not self._dirty or (not force and time.time() - self._saved_at < self.save_every): return
+        with self._lock: snapshot = dict(self._data); self._dirty = False; self._saved_at = time.time()
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True); tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f: pickle.dump(snapshot, f)
+            os.replace(tmp, self.path)
+        except Exception as e: print(f"Error saving cache {self.name}: {e}")
+
+    def lookup(self, key):
+        # 回傳 (狀態, 值)；狀態為 "fresh" / "stale" / "miss"
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                age = time.time() - entry[0]
+                if age < self.ttl: self._data.move_to_end(key); self.hits += 1; return "fresh", entry[1]
+                if age < self.ttl + self.stale: self._data.move_to_end(key); self.stale_hits += 1; return "stale", entry[1]
+                del self._data[key]
+            self.misses += 1
+            return "miss", None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time(), value); self._data.move_to_end(key); self._dirty = True
+            while len(self._data) > self.maxsize: self._data.popitem(last=False); self.evictions += 1
+        self.save()
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None: self._data.clear()
+            else: self._data.pop(key, None)
+            self._dirty = True
+
+    def stats(self):
+        total = self.hits + self.stale_hits + self.misses
+        return {"類別": self.name, "筆數": len(self._data), "命中": self.hits, "過期回傳": self.stale_hits, "未命中": self.misses,
+                "背景更新": self.refreshes, "淘汰": self.evictions, "命中率": round((self.hits + self.stale_hits) / total, 3) if total else 0.0}
+
+    def _refresh(self, key, fn, args, kwargs, cache_if):
+        try:
+            value = fn(*args, **kwargs)
+            if cache_if(value): self.set(key, value)
+            self.refreshes += 1
+        finally:
+            with self._lock: self._refreshing.discard(key)
+
+    def get_or_compute(self, key, fn, args=(), kwargs=None, cache_if=lambda v: v is not None):
+        kwargs = kwargs or {}
+        state, value = self.lookup(key)
+        if state == "fresh": return value
+        if state == "stale":
+            # stale-while-revalidate：先回舊值，背景執行緒更新 (同一個 key 同時只會有一個)
+            with self._lock:
+                if key in self._refreshing: return value
+                self._refreshing.add(key)
+            threading.Thread(target=self._refresh, args=(key, fn, args, kwargs, cache_if), daemon=True).start()
+            return value
+        value = fn(*args, **kwargs)
+        if cache_if(value): self.set(key, value)
+        return value
+
+# --- process 層級的快取實例 (模組只載入一次，Streamlit rerun 共用) ---
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(name):
+    with _caches_lock:
+        if name not in _caches:
+            ttl, maxsize, stale = CACHE_POLICY[name]
+            _caches[name] = TTLCache(name, ttl, maxsize, stale, persist=name not in MEMORY_ONLY and os.environ.get("STOCK_CACHE_PERSIST", "1") != "0")
+        return _caches[name]
+
+def cached(name, cache_if=lambda v: v is not None):
+    # 裝飾器：以 (函式名, 參數) 為 key；cache_if 決定結果是否值得快取 (失敗的預設值不快取)
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+            return get_cache(name).get_or_compute(key, fn, args, kwargs, cache_if)
+        wrapper.cache = lambda: get_cache(name)
+        return wrapper
+    return deco
+
+def cache_stats():
+    with _caches_lock: caches = list(_caches.values())
+    return [c.stats() for c in caches]
+
+def save_all():
+    with _caches_lock: caches = list(_caches.values())
+    for c in caches: c.save(force=True)
+
+atexit.register(save_all)
@@ -0,0 +1,36 @@
+import numpy as np
+from profiling import timed
+from scan_store import load_history
+
+# --- 繪圖函數 (plotly 在函式內才載入) ---
+@timed("圖表/儀表")
+def plot_gauge(value, title):
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number", value=value, title={'text': title, 'font': {'size': 18, 'color': '#333'}},
+        number={'font': {'size': 36}},
+        gauge={'axis': {'range': [0, 100], 'tickwidth': 1, 'tickcolor': "#666"},
+               'bar': {'color': "#222", 'thickness': 0.6}, 'bgcolor': "white", 'borderwidth': 1, 'bordercolor': "#ddd",
+               'steps': [{'range': [0, 30], 'color': "#ffcdd2"}, {'range': [30, 70], 'color': "#fff9c4"}, {'range': [70, 100], 'color': "#c8e6c9"}],
+               'threshold': {'line': {'color': "#d32f2f", 'width': 4}, 'thickness': 0.75, 'value': value}}))
+    fig.update_layout(height=250, margin=dict(l=30, r=30, t=50, b=10), paper_bgcolor="rgba(0,0,0,0)", font={'family': "Arial"})
+    return fig
+
+@timed("圖表/K線")
+def plot_chart(data):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    df = data.get('History'); name = data['名稱']
+    if df is None: df = load_history(data['代號'])
+    fig = make_subplots(rows=4, cols=1, shared_xaxes=True, row_heights=[0.5, 0.15, 0.15, 0.2], subplot_titles=(f"{name} 走勢", "成交量", "MACD", "OBV"))
+    fig.add_trace(go.Candlestick(x=df.index, open=df['Open'], high=df['High'], low=df['Low'], close=df['Close'], name='K線'), row=1, col=1)
+    fig.add_trace(go.Scatter(x=df.index, y=df['MA20'], line=dict(color='blue', width=1), name='月線'), row=1, col=1)
+    fig.add_trace(go.Scatter(x=df.index, y=df['BB_High'], line=dict(color='gray', width=1, dash='dot'), name='布林上'), row=1, col=1)
+    fig.add_trace(go.Scatter(x=df.index, y=df['BB_Low'], line=dict(color='gray', width=1, dash='dot'), name='布林下'), row=1, col=1)
+    fig.add_trace(go.Bar(x=df.index, y=df['Volume'], marker_color=np.where(df['Open'] < df['Close'], 'red', 'green'), name='量'), row=2, col=1)
+    fig.add_trace(go.Bar(x=df.index, y=df['MACD_Hist'], marker_color=np.where(df['MACD_Hist'] > 0, 'red', 'green'), name='MACD柱'), row=3, col=1)
+    fig.add_trace(go.Scatter(x=df.index, y=df['MACD'], line=dict(color='orange', width=1), name='DIF'), row=3, col=1)
+    fig.add_trace(go.Scatter(x=df.index, y=df['MACD_Signal'], line=dict(color='blue', width=1), name='DEA'), row=3, col=1)
+    fig.add_trace(go.Scatter(x=df.index, y=df['OBV'], line=dict(color='purple', width=2), name='OBV'), row=4, col=1)
+    fig.update_layout(height=900, xaxis_rangeslider_visible=False, showlegend=True, margin=dict(l=10,r=10,t=30,b=10))
+    return fig
@@ -0,0 +1,121 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+import pandas as pd
+from cache import get_cache
+from profiling import timed
+
+# --- 大戶籌碼爬蟲 (histock 400張/1000張持股)：連線池 + 限速 + 每週快取 ---
+HISTOCK_URL = "https://histock.tw/stock/large.aspx?no={code}"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7"
+}
+TABLE_RE = re.compile(r"<table\b.*?</table>", re.S | re.I)
+
+def clean_code(ticker): return ticker.split(".")[0]
+
+def week_key(ts=None):
+    # 集保大戶資料每週更新一次，以 ISO 週為快取 key
+    y, w, _ = (ts or pd.Timestamp.now()).isocalendar()
+    return f"{y}-W{w:02d}"
+
+class RateLimiter:
+    # 全部執行緒共用的最小請求間隔
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0.0; self._next = 0.0; self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic(); delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0: time.sleep(delay)
+
+def parse_weekly_table(html):
+    # 只把含「週別」(或「日期」) 的那張 <table> 交給 read_html，不解析整頁
+    for key in ("週別", "日期"):
+        for m in TABLE_RE.finditer(html):
+            block = m.group(0)
+            if key not in block: continue
+            try: tables = pd.read_html(StringIO(block))
+            except ValueError: continue
+            for df in tables:
+                if key in df.columns.astype(str): return df
+    return None
+
+def extract_chip(df):
+    if df is None or len(df) < 2: return None
+    # 模糊比對欄位名稱 (網站可能會改名)
+    col_1000 = [c for c in df.columns if "1000" in str(c) and "%" in str(c)]
+    col_400 = [c for c in df.columns if "400" in str(c) and "%" in str(c)]
+    if not (col_1000 and col_400): return None
+    latest = df.iloc[0]; prev = df.iloc[1]
+    val_1000 = float(latest[col_1000[0]]); val_400 = float(latest[col_400[0]])
+    return {
+        "400張": val_400,
+        "400張增減": val_400 - float(prev[col_400[0]]),
+        "1000張": val_1000,
+        "1000張增減": val_1000 - float(prev[col_1000[0]]),
+        "日期": str(latest.iloc[0])
+    }
+
+class ChipCrawler:
+    def __init__(self, fixture_dir=None, per_second=2.0, pool_size=8, timeout=5, max_workers=4):
+        self.fixture_dir = fixture_dir; self.timeout = timeout; self.max_workers = max_workers
+        self.limiter = RateLimiter(per_second); self.pool_size = pool_size; self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # keep-alive 連線池，所有請求共用
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                s = requests.Session(); s.headers.update(HEADERS)
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                      max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)))
+                s.mount("https://", adapter); s.mount("http://", adapter)
+                self._session = s
+            return self._session
+
+    def fetch_html(self, code):
+        if self.fixture_dir:
+            path = os.path.join(self.fixture_dir, f"{code}.html")
+            if not os.path.exists(path): return None
+            with open(path, encoding="utf-8") as f: return f.read()
+        self.limiter.wait()
+        response = self.session.get(HISTOCK_URL.format(code=code), timeout=self.timeout)
+        return response.text if response.status_code == 200 else None
+
+    @timed("籌碼/爬取")
+    def _crawl(self, ticker):
+        try: return extract_chip(parse_weekly_table(self.fetch_html(clean_code(ticker)) or ""))
+        except Exception as e:
+            print(f"Error fetching chip data: {e}")
+            return None
+
+    def get(self, ticker):
+        # 每檔每週最多抓一次；抓取失敗不寫入快取，下次仍會重試
+        return get_cache("chip").get_or_compute((clean_code(ticker), week_key()), self._crawl, (ticker,))
+
+    def prewarm(self, tickers, max_workers=None):
+        # 掃描完成後預先抓取整批結果的籌碼 (ETF 無大戶資料，略過)
+        todo = [t for t in dict.fromkeys(tickers) if not clean_code(t).startswith("00")]
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as ex:
+            return dict(zip(todo, ex.map(self.get, todo)))
+
+    def prewarm_async(self, tickers):
+        threading.Thread(target=self.prewarm, args=(list(tickers),), daemon=True).start()
+
+_crawler = None
+
+def get_crawler():
+    global _crawler
+    if _crawler is None: _crawler = ChipCrawler(fixture_dir=os.environ.get("CHIP_FIXTURE_DIR"))
+    return _crawler
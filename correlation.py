@@ -0,0 +1,173 @@
+import glob
+import hashlib
+import os
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+from data_provider import get_provider
+from indicators import Panel, _shift
+from stock_db import STOCK_DB, FLAT_STOCK_DB
+
+# --- 全市場相關係數服務：報酬率矩陣一次算完 (個股 × 基準、板塊 × 板塊)，每個交易日只算一次 ---
+# 基準可用 STOCK_BENCHMARKS="^SOX,^GSPC,^TWII" 設定
+BENCHMARKS = tuple(b.strip() for b in os.environ.get("STOCK_BENCHMARKS", "^SOX,^GSPC,^TWII").split(",") if b.strip())
+HOME_BENCHMARKS = ("^TWII", "^TWOII") # 與台股同一時段交易的指數；其餘 (美股) 在台股收盤後才收，報酬要落後一個台股交易日對齊
+WINDOWS = (20, 60, 120)
+DEFAULT_WINDOW = 60
+MIN_OVERLAP = 0.8 # 視窗內至少 80% 的日子兩邊都有報酬才計算
+CORR_PERIOD = "1y"
+CORR_VERSION = 2 # 計算方式改變時遞增，當日已存的舊表不再沿用
+CORR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "correlation")
+
+def masked_corr(x, y, min_periods):
+    # x: (日期 × N)、y: (日期 × M) 的報酬率，可含 NaN；每一對只用兩邊都有值的日子 (與 pandas corr 相同)，
+    # 以六個矩陣乘法一次算出 N × M 的相關係數
+    mx = ~np.isnan(x); my = ~np.isnan(y); x0 = np.where(mx, x, 0.0); y0 = np.where(my, y, 0.0)
+    mxf = mx.astype(float); myf = my.astype(float)
+    n = mxf.T @ myf; sx = x0.T @ myf; sy = mxf.T @ y0
+    sxx = (x0 * x0).T @ myf; syy = mxf.T @ (y0 * y0); sxy = x0.T @ y0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+        r = (n * sxy - sx * sy) / np.sqrt(var)
+    r[(n < min_periods) | ~(var > 0)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+def _lag_to(calendar, r):
+    # 台股第 D 日對到「D 日之前最後一個已收盤的海外交易日」的報酬；同一筆海外報酬不重複對到兩個台股交易日
+    pos = r.index.searchsorted(calendar, side="left") - 1
+    out = np.where(pos >= 0, r.to_numpy(dtype=float)[np.maximum(pos, 0)], np.nan)
+    out[1:][pos[1:] == pos[:-1]] = np.nan
+    return out
+
+def returns_on(calendar, frames, lagged=()):
+    # 各自的日報酬 (用自己的交易日計算，不跨停牌日補值)，再依日期對到共用的日期軸；lagged 內的 (海外基準) 落後一個台股交易日
+    if not frames: return np.empty((len(calendar), 0))
+    cols = []
+    for t, df in frames.items():
+        r = df["Close"].pct_change(fill_method=None)
+        cols.append(_lag_to(calendar, r) if t in lagged else r.reindex(calendar).to_numpy(dtype=float))
+    return np.column_stack(cols)
+
+def foreign(benchmarks):
+    return {b for b in benchmarks if b not in HOME_BENCHMARKS}
+
+class CorrelationTable:
+    # bench[w]: (個股 × 基準)、peer[w]: 個股與同板塊其他個股的平均相關、sector[w]: (板塊 × 板塊) 平均兩兩相關
+    def __init__(self, asof, tickers, benchmarks, sectors, calendar, bench_returns, bench, peer, sector):
+        self.asof = asof; self.tickers = tickers; self.benchmarks = benchmarks; self.sectors = sectors
+        self.calendar = calendar; self.bench_returns = bench_returns
+        self.bench = bench; self.peer = peer; self.sector = sector
+        self._pos = {t: i for i, t in enumerate(tickers)}
+
+    def row(self, ticker, window=DEFAULT_WINDOW, df=None):
+        # 單檔對各基準的相關係數 (查表 O(1))；不在清單內的代號當場只算這一檔 (df 為已抓好的日 K，未提供才下載)
+        i = self._pos.get(ticker)
+        if i is not None: return self.bench[window][i]
+        df = get_provider().fetch_one(ticker, period=CORR_PERIOD) if df is None else df
+        if df is None: return None
+        r = returns_on(self.calendar, {ticker: df})[-window:]
+        return masked_corr(r, self.bench_returns[-window:], int(window * MIN_OVERLAP))[0]
+
+    def lookup(self, ticker, window=DEFAULT_WINDOW, df=None):
+        # 回傳 (相關係數, 基準)：取連動最高的基準
+        return _best(self.row(ticker, window, df), self.benchmarks)
+
+    def peer_corr(self, ticker, window=DEFAULT_WINDOW):
+        i = self._pos.get(ticker)
+        return None if i is None else float(self.peer[window][i])
+
+    def sector_frame(self, window=DEFAULT_WINDOW):
+        return pd.DataFrame(self.sector[window], index=self.sectors, columns=self.sectors)
+
+    def benchmark_by_sector(self, window=DEFAULT_WINDOW):
+        # 各板塊成分股對各基準的平均相關
+        rows = {}
+        for sector in self.sectors:
+            idx = [self._pos[t] for t in STOCK_DB.get(sector, {}) if t in self._pos]
+            if idx: rows[sector] = np.nanmean(self.bench[window][idx], axis=0)
+        return pd.DataFrame(rows, index=self.benchmarks).T
+
+def _best(row, benchmarks):
+    # 只在海外基準中挑連動最高的 (本地大盤幾乎和每檔都最相關，沒有參考價值)；沒有海外基準時才用全部
+    if row is None: return 0, "N/A"
+    idx = [j for j, b in enumerate(benchmarks) if b not in HOME_BENCHMARKS] or list(range(len(benchmarks)))
+    sub = np.asarray(row, dtype=float)[idx]
+    if np.all(np.isnan(sub)): return 0, "N/A"
+    j = idx[int(np.nanargmax(sub))]; return float(row[j]), benchmarks[j]
+
+def lookup_one(ticker, window=DEFAULT_WINDOW, benchmarks=BENCHMARKS, provider=None, df=None):
+    # 當日相關係數表尚未算好時的單檔備援：只抓這一檔 (df 已提供就不抓) 與各基準，不觸發全市場下載
+    frames = (provider or get_provider()).fetch(list(benchmarks) if df is not None else [ticker, *benchmarks], period=CORR_PERIOD)
+    df = frames.get(ticker) if df is None else df; benchmarks = [b for b in benchmarks if b in frames and b != ticker]
+    if df is None or len(df) < 2 or not benchmarks: return 0, "N/A"
+    r = returns_on(df.index, {ticker: df})[-window:]; b = returns_on(df.index, {x: frames[x] for x in benchmarks}, foreign(benchmarks))[-window:]
+    return _best(masked_corr(r, b, int(window * MIN_OVERLAP))[0], benchmarks)
+
+def build_table(tickers, benchmarks=BENCHMARKS, windows=WINDOWS, sectors=None, provider=None):
+    provider = provider or get_provider(); sectors = sectors if sectors is not None else STOCK_DB
+    frames = {t: df for t, df in provider.fetch(list(tickers), period=CORR_PERIOD).items() if df is not None and len(df) > 1}
+    bench_frames = provider.fetch(list(benchmarks), period=CORR_PERIOD)
+    if not frames: return None
+    panel = Panel.aligned(frames); calendar = pd.DatetimeIndex(panel.dates[:, 0])
+    with np.errstate(divide="ignore", invalid="ignore"): rets = panel.close / _shift(panel.close) - 1
+    benchmarks = [b for b in benchmarks if b in bench_frames] # 抓不到的基準略過
+    bench_rets = returns_on(calendar, {b: bench_frames[b] for b in benchmarks}, foreign(benchmarks))
+    # 板塊成員矩陣 (個股 × 板塊)；一檔可同時屬於主題板塊與產業別
+    names = [s for s, stocks in sectors.items() if any(t in frames for t in stocks)]
+    pos = {t: i for i, t in enumerate(panel.tickers)}
+    member = np.zeros((len(panel.tickers), len(names)))
+    for k, s in enumerate(names):
+        for t in sectors[s]:
+            if t in pos: member[pos[t], k] = 1.0
+    primary = member.argmax(axis=1) # 個股的第一個板塊 (同板塊平均相關用)
+    bench, peer, sector = {}, {}, {}
+    for w in windows:
+        r = rets[-w:]; mp = int(w * MIN_OVERLAP)
+        bench[w] = masked_corr(r, bench_rets[-w:], mp).astype(np.float32)
+        c = masked_corr(r, r, mp); np.fill_diagonal(c, np.nan); valid = ~np.isnan(c); c0 = np.where(valid, c, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            by_sector = (c0 @ member) / (valid @ member) # 個股 × 板塊：與該板塊其他成分股的平均相關
+            sector[w] = ((member.T @ c0 @ member) / (member.T @ valid @ member)).astype(np.float32)
+        peer[w] = by_sector[np.arange(len(primary)), primary].astype(np.float32)
+    return CorrelationTable(calendar[-1], panel.tickers, benchmarks, names, calendar, bench_rets, bench, peer, sector)
+
+# --- 每個交易日一份：記憶體 -> 磁碟 -> 重算 ---
+# 查記憶體與磁碟都不上鎖；只有重算時取 _build_lock (同一時間只算一份)，compute=False 的呼叫永遠不會等它
+_tables = {}
+_build_lock = threading.Lock()
+
+def _table_key(tickers, benchmarks, windows):
+    digest = hashlib.md5("|".join([f"v{CORR_VERSION}", *sorted(tickers), "#", *benchmarks, "#", *map(str, windows)]).encode()).hexdigest()[:10]
+    return f"{pd.Timestamp.now():%Y%m%d}-{digest}"
+
+def _load_table(path):
+    if not os.path.exists(path): return None
+    try:
+        with open(path, "rb") as f: return pickle.load(f)
+    except Exception as e: print(f"Error loading correlations {path}: {e}")
+    return None
+
+def get_correlations(tickers=None, benchmarks=BENCHMARKS, windows=WINDOWS, folder=CORR_DIR, compute=True):
+    # compute=False 只取已算好的 (介面一般 rerun / 深度透視用，不觸發全市場下載，也不等正在進行的重算)
+    global _tables
+    tickers = list(FLAT_STOCK_DB) if tickers is None else list(dict.fromkeys(tickers))
+    key = _table_key(tickers, benchmarks, windows); path = os.path.join(folder, f"corr-{key}.pkl")
+    table = _tables.get(key)
+    if table is None: table = _load_table(path)
+    if table is None:
+        if not compute: return None
+        with _build_lock: # 等前一個重算完成後先再查一次，避免重複計算
+            table = _tables.get(key) or _load_table(path)
+            if table is None:
+                table = build_table(tickers, benchmarks, windows)
+                if table is None: return None
+                try:
+                    os.makedirs(folder, exist_ok=True); tmp = path + ".tmp"
+                    with open(tmp, "wb") as f: pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    os.replace(tmp, path)
+                    for old in glob.glob(os.path.join(folder, "corr-*.pkl")):
+                        if old != path: os.remove(old) # 只留當日
+                except Exception as e: print(f"Error saving correlations: {e}")
+    if key not in _tables: _tables = {key: table} # 整個換掉 (單一賦值)，其他執行緒不會讀到清到一半的 dict
+    return table
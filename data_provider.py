@@ -0,0 +1,164 @@
+import functools
+import os
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+from profiling import timed
+
+# --- 行情資料供應層 (可替換：yfinance / 離線 CSV) ---
+OHLCV_COLS = ["Open", "High", "Low", "Close", "Volume"]
+
+def normalize_ohlcv(df):
+    if df is None or len(df) == 0: return None
+    if isinstance(df.columns, pd.MultiIndex): df.columns = df.columns.get_level_values(0)
+    df = df.loc[:, ~df.columns.duplicated()]
+    if not set(OHLCV_COLS).issubset(df.columns): return None
+    df = df[OHLCV_COLS].dropna(subset=["Close"])
+    if df.index.tz is not None: df.index = df.index.tz_localize(None)
+    return df if len(df) else None
+
+def period_start(period, end):
+    # "5d" / "3mo" / "6mo" / "2y" / "max" -> 起始日期
+    if period in (None, "max"): return None
+    n = int("".join(c for c in period if c.isdigit()) or 1); unit = period.lstrip("0123456789")
+    if unit == "d": return end - pd.Timedelta(days=n)
+    if unit == "wk": return end - pd.Timedelta(weeks=n)
+    if unit == "mo": return end - pd.DateOffset(months=n)
+    if unit == "y": return end - pd.DateOffset(years=n)
+    if unit == "ytd": return pd.Timestamp(year=end.year, month=1, day=1)
+    raise ValueError(f"unknown period: {period}")
+
+def trim_period(df, period):
+    # 從較長的已抓資料切出最近 period (以最後一根 K 棒為準)，供多個用途共用同一次下載
+    lo = period_start(period, df.index[-1])
+    return df if lo is None else df[df.index >= lo]
+
+class DataProvider:
+    # 子類別只需實作 fetch；回傳 {ticker: OHLCV DataFrame}，抓不到的代號直接缺席
+    def fetch(self, tickers, period="6mo", interval="1d", start=None, progress=None):
+        raise NotImplementedError
+
+    def fetch_one(self, ticker, period="6mo", interval="1d", start=None):
+        return self.fetch([ticker], period=period, interval=interval, start=start).get(ticker)
+
+class YFinanceProvider(DataProvider):
+    # yf.download 內部共用模組層級狀態 (shared._DFS)，同時兩個 download 會互相覆蓋，
+    # 因此批次之間以鎖串行，批次內交給 yfinance 自己的有界執行緒池並行
+    _lock = threading.Lock()
+
+    def __init__(self, batch_size=40, max_workers=8, timeout=10, retries=2, backoff=1.0):
+        self.batch_size = batch_size; self.max_workers = max_workers
+        self.timeout = timeout; self.retries = retries; self.backoff = backoff
+
+    @timed("抓取/yfinance")
+    def _download(self, batch, period, interval, start):
+        import yfinance as yf
+        kw = dict(interval=interval, group_by="ticker", progress=False, timeout=self.timeout,
+                  threads=min(self.max_workers, len(batch)) if len(batch) > 1 else False)
+        if start is not None: kw["start"] = start
+        else: kw["period"] = period
+        with self._lock: raw = yf.download(batch, **kw)
+        out = {}
+        if raw is None or raw.empty: return out
+        for t in batch:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if t not in raw.columns.get_level_values(0): continue
+                sub = raw[t].copy()
+            elif len(batch) == 1: sub = raw.copy()
+            else: continue
+            df = normalize_ohlcv(sub)
+            if df is not None: out[t] = df
+        return out
+
+    def _fetch_batch(self, batch, period, interval, start):
+        result = {}; pending = list(batch)
+        for attempt in range(self.retries + 1):
+            try: result.update(self._download(pending, period, interval, start))
+            except Exception as e: print(f"Error fetching {pending[:3]}...: {e}")
+            pending = [t for t in pending if t not in result]
+            if not pending: break
+            if attempt < self.retries: time.sleep(self.backoff * (attempt + 1)) # 最後一次失敗不必再等
+        return result
+
+    def fetch(self, tickers, period="6mo", interval="1d", start=None, progress=None):
+        tickers = list(dict.fromkeys(tickers)); result = {}
+        for i in range(0, len(tickers), self.batch_size):
+            result.update(self._fetch_batch(tickers[i:i+self.batch_size], period, interval, start))
+            if progress: progress(min(i + self.batch_size, len(tickers)), len(tickers))
+        return result
+
+class CSVProvider(DataProvider):
+    # 離線資料夾：每檔一個 <ticker>.csv (Date 為索引)，供測試與效能量測使用
+    def __init__(self, folder):
+        self.folder = folder
+
+    def _load(self, ticker):
+        path = os.path.join(self.folder, f"{ticker}.csv")
+        if not os.path.exists(path): return None
+        return normalize_ohlcv(pd.read_csv(path, index_col=0, parse_dates=True))
+
+    @timed("抓取/CSV")
+    def fetch(self, tickers, period="6mo", interval="1d", start=None, progress=None):
+        tickers = list(dict.fromkeys(tickers)); result = {}
+        for i, t in enumerate(tickers):
+            df = self._load(t)
+            if df is not None:
+                lo = pd.Timestamp(start) if start is not None else period_start(period, df.index[-1])
+                if lo is not None: df = df[df.index >= lo]
+                if len(df): result[t] = df
+            if progress: progress(i + 1, len(tickers))
+        return result
+
+# --- 合成行情 (不需網路)：回測與效能量測用，同一代號每次產生的資料相同 ---
+@functools.lru_cache(maxsize=8)
+def _business_days(end, days):
+    return pd.bdate_range(end=end, periods=days, name="Date")
+
+def synthetic_ohlcv(ticker, days, end=None, seed=0):
+    rng = np.random.default_rng(zlib.crc32(ticker.encode()) + seed)
+    idx = _business_days(pd.Timestamp(end or pd.Timestamp.now()).normalize(), days)
+    # 帶有緩慢變化趨勢的隨機漫步，讓均線/突破類條件有機會觸發
+    drift = np.repeat(rng.normal(0, 0.002, days // 60 + 1), 60)[:days]
+    close = rng.uniform(20, 800) * np.exp(np.cumsum(drift + rng.normal(0, 0.018, days)))
+    open_ = np.r_[close[0], close[:-1]] * (1 + rng.normal(0, 0.006, days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, days)))
+    volume = np.round(rng.lognormal(np.log(rng.uniform(2e5, 2e7)), 0.5, days))
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}, index=idx)
+
+def synthetic_universe(n, prefix="S"):
+    return [f"{prefix}{i:04d}.TW" for i in range(n)]
+
+class SyntheticProvider(DataProvider):
+    def __init__(self, days=2520, end=None, seed=0):
+        self.days = days; self.end = end; self.seed = seed
+
+    @timed("抓取/合成")
+    def fetch(self, tickers, period="6mo", interval="1d", start=None, progress=None):
+        tickers = list(dict.fromkeys(tickers)); result = {}
+        for i, t in enumerate(tickers):
+            df = synthetic_ohlcv(t, self.days, self.end, self.seed)
+            lo = pd.Timestamp(start) if start is not None else period_start(period, df.index[-1])
+            result[t] = df[df.index >= lo] if lo is not None else df
+            if progress: progress(i + 1, len(tickers))
+        return result
+
+# --- 全域預設供應者 (模組層級，Streamlit rerun 不會重建) ---
+_provider = None
+
+def get_provider():
+    # 預設：yfinance 外面包一層本地 OHLCV 資料庫；設定 STOCK_CSV_DIR 則改用離線 CSV
+    global _provider
+    if _provider is None:
+        folder = os.environ.get("STOCK_CSV_DIR")
+        if folder: _provider = CSVProvider(folder)
+        else:
+            from ohlcv_store import OHLCVStore, DEFAULT_STORE_PATH
+            _provider = OHLCVStore(YFinanceProvider(), path=os.environ.get("STOCK_STORE_PATH", DEFAULT_STORE_PATH))
+    return _provider
+
+def set_provider(provider):
+    global _provider
+    _provider = provider
@@ -0,0 +1,32 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# --- 深度透視並行管線：各資料來源同時抓取，整體共用一個延遲預算 ---
+DEEP_DIVE_BUDGET = 8.0
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="deep-dive")
+
+def once(fn):
+    # 多個並行工作共用同一份結果 (例如同一檔的基礎 K 線)：第一個呼叫的執行，其餘等它，不重複下載
+    lock = threading.Lock(); box = []
+    def wrapper():
+        with lock:
+            if not box: box.append(fn())
+        return box[0]
+    return wrapper
+
+def run_with_budget(tasks, on_result, budget=DEEP_DIVE_BUDGET):
+    # tasks: {名稱: 無參數函式}。每完成一項就在呼叫端執行緒 (Streamlit 主執行緒) 呼叫 on_result(名稱, 值, 逾時)，
+    # 可以立刻畫出該區塊；超過預算仍未完成的以 (名稱, None, True) 回報。逾時的工作仍在背景跑完並寫入快取，下次即可命中
+    deadline = time.monotonic() + budget
+    futures = {_executor.submit(fn): name for name, fn in tasks.items()}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done: break
+        for f in done:
+            try: value = f.result()
+            except Exception as e: print(f"Error in deep dive task {futures[f]}: {e}"); value = None
+            on_result(futures[f], value, False)
+    for f in pending: on_result(futures[f], None, True)
+    return [futures[f] for f in pending]
@@ -0,0 +1,164 @@
+import argparse
+import numpy as np
+import pandas as pd
+from data_provider import OHLCV_COLS
+
+# --- 向量化指標引擎：全部個股對齊成 (K棒 × 個股) 的 2-D 陣列一次計算 ---
+# 每檔個股以「最後一根 K 棒」靠右對齊，上方不足的部分補 NaN；
+# 如此每欄都是該股自己的連續 K 棒序列，計算結果與逐檔用 ta 算出的一致
+INDICATOR_COLS = ["MA5", "MA20", "MA60", "RSI", "Vol_MA5", "MACD", "MACD_Signal", "MACD_Hist",
+                  "OBV", "OBV_MA10", "MFI", "BB_High", "BB_Low", "BB_Width"]
+
+class Panel:
+    def __init__(self, tickers, dates, open, high, low, close, volume):
+        self.tickers = list(tickers); self.dates = dates
+        self.open = open; self.high = high; self.low = low; self.close = close; self.volume = volume
+        self.bars = (~np.isnan(close)).sum(axis=0)
+
+    @classmethod
+    def from_frames(cls, frames, length=None):
+        tickers = list(frames); T = max((len(df) for df in frames.values()), default=0)
+        if length: T = min(T, length)
+        arrs = {c: np.full((T, len(tickers)), np.nan) for c in OHLCV_COLS}
+        dates = np.full((T, len(tickers)), np.datetime64("NaT"), dtype="datetime64[ns]")
+        for j, t in enumerate(tickers):
+            df = frames[t].iloc[-T:] if T else frames[t].iloc[:0]; n = len(df)
+            if n == 0: continue
+            for c in OHLCV_COLS: arrs[c][T-n:, j] = df[c].to_numpy(dtype=float)
+            dates[T-n:, j] = df.index.to_numpy(dtype="datetime64[ns]")
+        return cls(tickers, dates, arrs["Open"], arrs["High"], arrs["Low"], arrs["Close"], arrs["Volume"])
+
+    @classmethod
+    def aligned(cls, frames, index=None):
+        # 依日期對齊 (回測用)：所有個股共用同一條日期軸，上市前/停牌日為 NaN
+        tickers = list(frames)
+        if index is None: index = pd.DatetimeIndex(sorted(set().union(*(df.index for df in frames.values()))))
+        arrs = {c: pd.concat({t: frames[t][c] for t in tickers}, axis=1).reindex(index).to_numpy(dtype=float) for c in OHLCV_COLS}
+        dates = np.broadcast_to(index.to_numpy(dtype="datetime64[ns]")[:, None], (len(index), len(tickers)))
+        return cls(tickers, dates, arrs["Open"], arrs["High"], arrs["Low"], arrs["Close"], arrs["Volume"])
+
+    def frame(self, ticker, ind=None):
+        # 還原單一個股的 DataFrame (與 analyze_stock_strategy 舊版的 df 欄位相同)
+        j = self.tickers.index(ticker); n = int(self.bars[j]); T = len(self.close)
+        cols = {"Open": self.open, "High": self.high, "Low": self.low, "Close": self.close, "Volume": self.volume}
+        if ind: cols.update({k: ind[k] for k in INDICATOR_COLS})
+        df = pd.DataFrame({k: v[T-n:, j] for k, v in cols.items()}, index=pd.DatetimeIndex(self.dates[T-n:, j], name="Date"))
+        return df
+
+# --- 向量化 kernel (沿時間軸 axis=0，同時處理所有個股) ---
+def _shift(x, n=1):
+    out = np.full_like(x, np.nan); out[n:] = x[:-n]
+    return out
+
+def rolling_sum(x, w):
+    valid = ~np.isnan(x)
+    c = np.cumsum(np.where(valid, x, 0.0), axis=0); k = np.cumsum(valid, axis=0)
+    s = c.copy(); s[w:] -= c[:-w]; k[w:] = k[w:] - k[:-w]
+    s[k < w] = np.nan
+    return s
+
+def rolling_mean(x, w):
+    # 先減去每欄參考值再累加，降低 cumsum 相減的浮點誤差
+    ref = np.nan_to_num(np.nanmean(x, axis=0)) if x.size else 0.0
+    return rolling_sum(x - ref, w) / w + ref
+
+def rolling_std(x, w):
+    ref = np.nan_to_num(np.nanmean(x, axis=0)) if x.size else 0.0
+    d = x - ref; m = rolling_sum(d, w) / w
+    return np.sqrt(np.maximum(rolling_sum(d * d, w) / w - m * m, 0.0))
+
+def ewm(x, alpha, min_periods):
+    # 等同 pandas ewm(adjust=False)：從每欄第一個有效值起算
+    out = np.empty_like(x); prev = np.full(x.shape[1:], np.nan); cnt = np.zeros(x.shape, dtype=np.int64); seen = np.zeros(x.shape[1:], dtype=np.int64)
+    for t in range(len(x)):
+        xt = x[t]; v = ~np.isnan(xt); seen = seen + v
+        prev = np.where(v, np.where(np.isnan(prev), xt, (1 - alpha) * prev + alpha * xt), prev)
+        out[t] = prev; cnt[t] = seen
+    out[cnt < min_periods] = np.nan
+    return out
+
+def ema(x, span):
+    return ewm(x, 2.0 / (span + 1), span)
+
+def compute_indicators(panel):
+    c, h, l, v = panel.close, panel.high, panel.low, panel.volume
+    pad = np.isnan(c); prev_c = _shift(c)
+    ind = {"MA5": rolling_mean(c, 5), "MA20": rolling_mean(c, 20), "MA60": rolling_mean(c, 60), "Vol_MA5": rolling_mean(v, 5)}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diff = c - prev_c
+        up = np.where(diff > 0, diff, 0.0); dn = np.where(diff < 0, -diff, 0.0); up[pad] = np.nan; dn[pad] = np.nan
+        emaup = ewm(up, 1 / 14, 14); emadn = ewm(dn, 1 / 14, 14)
+        ind["RSI"] = np.where(emadn == 0, 100.0, 100 - 100 / (1 + emaup / emadn))
+
+        macd = ema(c, 12) - ema(c, 26); sig = ema(macd, 9)
+        ind["MACD"] = macd; ind["MACD_Signal"] = sig; ind["MACD_Hist"] = macd - sig
+
+        obv = np.where(c < prev_c, -v, v); obv[pad] = np.nan
+        obv = np.nancumsum(obv, axis=0); obv[pad] = np.nan
+        ind["OBV"] = obv; ind["OBV_MA10"] = rolling_mean(obv, 10)
+
+        tp = (h + l + c) / 3.0; prev_tp = _shift(tp)
+        mfr = tp * v * np.where(tp > prev_tp, 1, np.where(tp < prev_tp, -1, 0))
+        pos = np.where(mfr >= 0, mfr, 0.0); neg = np.where(mfr < 0, mfr, 0.0); pos[pad] = np.nan; neg[pad] = np.nan
+        ind["MFI"] = 100 - 100 / (1 + rolling_sum(pos, 14) / np.abs(rolling_sum(neg, 14)))
+
+        std = rolling_std(c, 20)
+        ind["BB_High"] = ind["MA20"] + 2 * std; ind["BB_Low"] = ind["MA20"] - 2 * std
+        ind["BB_Width"] = (ind["BB_High"] - ind["BB_Low"]) / ind["MA20"]
+    return ind
+
+def latest_table(panel, ind):
+    # 每檔最新一列 + 策略需要的前一根值與近 20 日最大量 K 棒的主力成本
+    snap = pd.DataFrame({"Open": panel.open[-1], "High": panel.high[-1], "Low": panel.low[-1], "Close": panel.close[-1], "Volume": panel.volume[-1]}, index=panel.tickers)
+    for k in INDICATOR_COLS: snap[k] = ind[k][-1]
+    snap["Prev_Close"] = panel.close[-2] if len(panel.close) > 1 else np.nan
+    snap["Prev_MACD_Hist"] = ind["MACD_Hist"][-2] if len(panel.close) > 1 else np.nan
+    rv = panel.volume[-20:]; i = np.argmax(np.where(np.isnan(rv), -np.inf, rv), axis=0); cols = np.arange(len(panel.tickers))
+    snap["Big_Player_Cost"] = (panel.open[-20:][i, cols] + panel.close[-20:][i, cols]) / 2
+    snap["Bars"] = panel.bars
+    return snap
+
+def add_indicators(df):
+    # 單檔便利函式：回傳加上全部指標欄位的 df
+    panel = Panel.from_frames({"_": df})
+    return panel.frame("_", compute_indicators(panel))
+
+def verify_against_ta(df, ours=None):
+    # 與 ta 套件逐欄比較，回傳各欄最大相對誤差；ours 為已算好的指標 (預設用 add_indicators 重算)
+    from ta.trend import SMAIndicator, MACD
+    from ta.momentum import RSIIndicator
+    from ta.volume import OnBalanceVolumeIndicator, MFIIndicator
+    from ta.volatility import BollingerBands
+    ref = pd.DataFrame(index=df.index)
+    ref['MA5'] = SMAIndicator(df['Close'], 5).sma_indicator(); ref['MA20'] = SMAIndicator(df['Close'], 20).sma_indicator(); ref['MA60'] = SMAIndicator(df['Close'], 60).sma_indicator()
+    ref['RSI'] = RSIIndicator(df['Close'], 14).rsi(); ref['Vol_MA5'] = SMAIndicator(df['Volume'], 5).sma_indicator()
+    macd = MACD(df['Close']); ref['MACD'] = macd.macd(); ref['MACD_Signal'] = macd.macd_signal(); ref['MACD_Hist'] = macd.macd_diff()
+    ref['OBV'] = OnBalanceVolumeIndicator(df['Close'], df['Volume']).on_balance_volume(); ref['OBV_MA10'] = SMAIndicator(ref['OBV'], 10).sma_indicator()
+    ref['MFI'] = MFIIndicator(df['High'], df['Low'], df['Close'], df['Volume'], 14).money_flow_index()
+    bb = BollingerBands(df['Close']); ref['BB_High'] = bb.bollinger_hband(); ref['BB_Low'] = bb.bollinger_lband(); ref['BB_Width'] = (ref['BB_High']-ref['BB_Low'])/ref['MA20']
+    ours = add_indicators(df) if ours is None else ours; out = {}
+    for k in INDICATOR_COLS:
+        a = ours[k].to_numpy(dtype=float); b = ref[k].to_numpy(dtype=float)
+        err = np.where(np.isnan(a) != np.isnan(b), np.inf, np.abs(a - b) / np.maximum(np.abs(b), 1e-9))
+        out[k] = float(np.nanmax(err, initial=0.0))
+    return out
+
+def check_against_ta(n=20, seed=0):
+    # 離線檢查：長短不一的合成個股一起走 Panel 向量化計算 (與掃描相同路徑)，逐檔和 ta 比較，回傳各欄最大相對誤差
+    from data_provider import synthetic_ohlcv, synthetic_universe
+    frames = {t: synthetic_ohlcv(t, 80 + 37 * i, end="2025-12-31", seed=seed) for i, t in enumerate(synthetic_universe(n, prefix="V"))}
+    panel = Panel.from_frames(frames); ind = compute_indicators(panel); worst = {}
+    for t, df in frames.items():
+        for k, err in verify_against_ta(df, panel.frame(t, ind)).items(): worst[k] = max(worst.get(k, 0.0), err)
+    return worst
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="向量化指標與 ta 套件的一致性檢查 (合成資料，不需網路)")
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--tol", type=float, default=1e-8, help="容許的最大相對誤差")
+    args = parser.parse_args()
+    worst = check_against_ta(args.tickers)
+    for k, err in worst.items(): print(f"{k:12s} {err:.2e}{'  ✗' if err > args.tol else ''}")
+    bad = [k for k, err in worst.items() if err > args.tol]
+    if bad: raise SystemExit(f"{len(bad)} 個指標與 ta 差異超過 {args.tol:g}：{', '.join(bad)}")
+    print(f"{args.tickers} 檔合成個股全部指標與 ta 一致 (誤差 ≤ {args.tol:g})")
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+from data_provider import DataProvider, OHLCV_COLS, period_start
+from profiling import stage, timed
+
+# --- 本地 OHLCV 資料庫 (SQLite)：只補抓最後一根 K 棒之後的缺口 ---
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ohlcv.sqlite")
+# 補抓時往前多抓幾天已收盤的 K 棒：yfinance 給的是還原價，除權息後整段歷史會換基準，重疊的 K 棒對不上就整段重抓
+OVERLAP_DAYS = 7
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker TEXT NOT NULL, interval TEXT NOT NULL, date TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (ticker, interval, date)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    ticker TEXT NOT NULL, interval TEXT NOT NULL,
+    covered_from TEXT, last_bar TEXT, last_sync REAL, last_access REAL,
+    PRIMARY KEY (ticker, interval)
+);
+CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+class OHLCVStore(DataProvider):
+    # 本身也是 DataProvider：analyze_stock_strategy / calculate_correlation / plot_chart 都透過它讀本地資料
+    def __init__(self, upstream, path=DEFAULT_STORE_PATH, refresh_interval=60):
+        self.upstream = upstream; self.path = path; self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as con: con.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            yield con; con.commit()
+        finally: con.close()
+
+    def _meta(self, con, tickers, interval):
+        rows = con.execute(f"SELECT ticker, covered_from, last_bar, last_sync FROM meta WHERE interval=? AND ticker IN ({','.join('?'*len(tickers))})", [interval, *tickers]).fetchall()
+        return {r[0]: r[1:] for r in rows}
+
+    def _write(self, con, ticker, interval, df, covered_from):
+        rows = [(ticker, interval, ts.isoformat(), *map(float, vals)) for ts, vals in zip(df.index, df[OHLCV_COLS].to_numpy())]
+        con.executemany("INSERT OR REPLACE INTO bars VALUES (?,?,?,?,?,?,?,?)", rows)
+        old = con.execute("SELECT covered_from FROM meta WHERE ticker=? AND interval=?", (ticker, interval)).fetchone()
+        if old and old[0] is not None and (covered_from is None or old[0] < covered_from): covered_from = old[0]
+        last_bar = con.execute("SELECT MAX(date) FROM bars WHERE ticker=? AND interval=?", (ticker, interval)).fetchone()[0]
+        con.execute("INSERT OR REPLACE INTO meta VALUES (?,?,?,?,?,?)", (ticker, interval, covered_from, last_bar, time.time(), time.time()))
+
+    def _basis_changed(self, con, ticker, interval, df, last_bar):
+        # 重疊區間內已收盤的 K 棒 (不含庫存最後一根，可能是盤中) 收盤價與庫存不同 -> 還原基準變了
+        new = {ts.isoformat(): float(c) for ts, c in zip(df.index, df["Close"].to_numpy())}
+        old = con.execute("SELECT date, close FROM bars WHERE ticker=? AND interval=? AND date >= ? AND date < ?",
+                          (ticker, interval, df.index[0].isoformat(), last_bar)).fetchall()
+        return any(d in new and abs(new[d] - c) > 1e-6 * abs(c) for d, c in old)
+
+    def _read(self, con, tickers, interval, start):
+        q = f"SELECT ticker, date, open, high, low, close, volume FROM bars WHERE interval=? AND ticker IN ({','.join('?'*len(tickers))})"
+        args = [interval, *tickers]
+        if start is not None: q += " AND date >= ?"; args.append(start.isoformat())
+        raw = pd.read_sql_query(q + " ORDER BY ticker, date", con, params=args)
+        out = {}
+        for t, g in raw.groupby("ticker", sort=False):
+            df = g.drop(columns="ticker").set_index("date"); df.index = pd.to_datetime(df.index); df.index.name = "Date"
+            df.columns = OHLCV_COLS; out[t] = df
+        return out
+
+    @timed("抓取/資料庫同步")
+    def sync(self, tickers, want_from=None, interval="1d", progress=None):
+        # 依缺口分組：從未抓過/涵蓋期間不足 -> 整段下載；其餘從最後一根 K 棒 (含，可能是盤中未收盤) 往前 OVERLAP_DAYS 天起補抓，
+        # 重疊部分與庫存不同 (除權息後還原價換基準) 的代號清掉重抓，避免新舊基準接在一起出現假跳空
+        # covered_from 為 "" 代表已抓過全部歷史 (period="max")
+        tickers = list(dict.fromkeys(tickers)); now = time.time()
+        want = want_from.isoformat() if want_from is not None else ""
+        with self._connect() as con: meta = self._meta(con, tickers, interval)
+        full, incr = [], {}
+        for t in tickers:
+            covered_from, last_bar, last_sync = meta.get(t, (None, None, None))
+            if last_bar is None: # 從未抓過，或上次抓回空資料 (新上市 / 下市 / 錯誤代號)：同樣受 refresh_interval 限制
+                if now - (last_sync or 0) >= self.refresh_interval: full.append(t)
+            elif covered_from is None or want < covered_from:
+                full.append(t)
+            elif now - (last_sync or 0) >= self.refresh_interval:
+                start = (pd.Timestamp(last_bar[:10]) - pd.Timedelta(days=OVERLAP_DAYS)).strftime("%Y-%m-%d")
+                incr.setdefault(start, []).append(t)
+        jobs = [(full, dict(period="max") if want_from is None else dict(start=want_from.strftime("%Y-%m-%d")))] if full else []
+        jobs += [(ts, dict(start=start)) for start, ts in sorted(incr.items())]
+        total = sum(len(ts) for ts, _ in jobs); done = 0; rebase = {}
+        for ts, kw in jobs:
+            cb = (lambda d, n, base=done: progress(base + d, total)) if progress else None
+            frames = self.upstream.fetch(ts, interval=interval, progress=cb, **kw)
+            covered = want if ts is full else None
+            with self._lock, self._connect() as con:
+                for t, df in frames.items():
+                    if covered is None and len(df) and self._basis_changed(con, t, interval, df, meta[t][1]):
+                        rebase.setdefault(meta[t][0], []).append(t) # 依原涵蓋起點分組重抓
+                        con.execute("DELETE FROM bars WHERE ticker=? AND interval=?", (t, interval)); con.execute("DELETE FROM meta WHERE ticker=? AND interval=?", (t, interval))
+                    else: self._write(con, t, interval, df, covered)
+                # 沒有新資料的代號也記錄同步時間 (沒有 meta 的新建一列，last_bar 留空)，避免在 refresh_interval 內重複請求
+                con.executemany("INSERT INTO meta VALUES (?,?,NULL,NULL,?,?) ON CONFLICT(ticker, interval) DO UPDATE SET last_sync=excluded.last_sync",
+                                [(t, interval, time.time(), time.time()) for t in ts if t not in frames])
+            done += len(ts)
+        for covered_from, ts in rebase.items():
+            frames = self.upstream.fetch(ts, interval=interval, **(dict(period="max") if covered_from == "" else dict(start=covered_from[:10])))
+            with self._lock, self._connect() as con:
+                for t, df in frames.items(): self._write(con, t, interval, df, covered_from)
+        return total
+
+    def read(self, tickers, period="6mo", interval="1d", start=None):
+        # 唯讀：只讀本地已有的 K 棒，不同步也不連網 (背景掃描的子 process 用，資料已由主 process 同步)
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers: return {}
+        lo = pd.Timestamp(start) if start is not None else period_start(period, pd.Timestamp.now().normalize())
+        with self._connect() as con:
+            with stage("抓取/資料庫讀取"): return self._read(con, tickers, interval, lo)
+
+    def fetch(self, tickers, period="6mo", interval="1d", start=None, progress=None):
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers: return {}
+        lo = pd.Timestamp(start) if start is not None else period_start(period, pd.Timestamp.now().normalize())
+        self.sync(tickers, want_from=lo, interval=interval, progress=progress)
+        with self._lock, self._connect() as con:
+            with stage("抓取/資料庫讀取"): out = self._read(con, tickers, interval, lo)
+            con.executemany("UPDATE meta SET last_access=? WHERE ticker=? AND interval=?", [(time.time(), t, interval) for t in out])
+        return out
+
+    # --- 壓縮 / 淘汰：移出 STOCK_DB 且閒置過久的代號刪除，過舊 K 棒裁切 ---
+    def compact(self, keep_tickers, max_idle_days=30, retain_days=None):
+        keep = set(keep_tickers); cutoff = time.time() - max_idle_days * 86400
+        with self._lock, self._connect() as con:
+            stale = [t for t, acc in con.execute("SELECT ticker, MAX(last_access) FROM meta GROUP BY ticker") if t not in keep and (acc or 0) < cutoff]
+            for t in stale:
+                con.execute("DELETE FROM bars WHERE ticker=?", (t,)); con.execute("DELETE FROM meta WHERE ticker=?", (t,))
+            if retain_days:
+                floor = (pd.Timestamp.now().normalize() - pd.Timedelta(days=retain_days)).isoformat()
+                con.execute("DELETE FROM bars WHERE date < ?", (floor,))
+                con.execute("UPDATE meta SET covered_from=? WHERE covered_from < ?", (floor, floor))
+            con.execute("INSERT OR REPLACE INTO store_info VALUES ('last_compact', ?)", (str(time.time()),))
+        with self._lock, self._connect() as con: con.execute("VACUUM")
+        return stale
+
+    def maybe_compact(self, keep_tickers, every_seconds=86400, **kw):
+        with self._connect() as con: row = con.execute("SELECT value FROM store_info WHERE key='last_compact'").fetchone()
+        if row and time.time() - float(row[0]) < every_seconds: return []
+        return self.compact(keep_tickers, **kw)
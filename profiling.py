@@ -0,0 +1,52 @@
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# --- 效能量測：各階段的計時與計數 (process 層級，所有 session / 背景執行緒共用) ---
+# 用法：with stage("掃描/指標"): ...、@timed("圖表/K線")、count("掃描/檔數", n)
+class StageStats:
+    def __init__(self):
+        self._data = {}; self._counters = {}; self._lock = threading.Lock(); self.started = time.time()
+
+    def add(self, name, seconds):
+        with self._lock:
+            n, total, worst, _ = self._data.get(name, (0, 0.0, 0.0, 0.0))
+            self._data[name] = (n + 1, total + seconds, max(worst, seconds), seconds)
+
+    def count(self, name, n=1):
+        with self._lock: self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock: self._data.clear(); self._counters.clear(); self.started = time.time()
+
+    def rows(self):
+        with self._lock: data = dict(self._data)
+        return [{"階段": name, "次數": n, "總秒數": round(total, 4), "平均ms": round(total / n * 1000, 2), "最大ms": round(worst * 1000, 2), "最近ms": round(last * 1000, 2)}
+                for name, (n, total, worst, last) in sorted(data.items())]
+
+    def counters(self):
+        with self._lock: return dict(self._counters)
+
+    def to_json(self):
+        return json.dumps({"since": self.started, "stages": self.rows(), "counters": self.counters()}, ensure_ascii=False, indent=2)
+
+STATS = StageStats()
+
+@contextmanager
+def stage(name):
+    t0 = time.perf_counter()
+    try: yield
+    finally: STATS.add(name, time.perf_counter() - t0)
+
+def timed(name):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name): return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def count(name, n=1):
+    STATS.count(name, n)
@@ -0,0 +1,47 @@
+import sys
+import numpy as np
+import pandas as pd
+from cache import get_cache
+from data_provider import get_provider
+from indicators import add_indicators
+
+# --- 精簡掃描結果：session 只存型別化的欄位，K 線歷史放在 process 共用快取、需要時才載入 ---
+HISTORY_PERIOD = "6mo"
+
+def compact_snap(snap):
+    # latest_table 的數值欄位降為 float32、K 棒數為 int16 (評分請在降精度之前做完)
+    out = snap.astype(np.float32)
+    if "Bars" in out: out["Bars"] = snap["Bars"].astype(np.int16)
+    return out
+
+def compact_history(df):
+    return df.astype(np.float32)
+
+def _build_history(ticker):
+    df = get_provider().fetch_one(ticker, period=HISTORY_PERIOD)
+    return None if df is None or len(df) == 0 else compact_history(add_indicators(df))
+
+def load_history(ticker, build=None):
+    # 依代號向共用快取取指標歷史 (所有 session 共用同一份)；build 為已算好資料的無參數函式，未提供時從行情資料庫重建
+    return get_cache("history").get_or_compute(ticker, lambda: compact_history(build()) if build else _build_history(ticker))
+
+def footprint(obj):
+    # 估算物件佔用的記憶體位元組數 (DataFrame 含 object 欄位內容)
+    if isinstance(obj, (pd.DataFrame, pd.Series)): return int(np.sum(obj.memory_usage(deep=True)))
+    if isinstance(obj, np.ndarray): return obj.nbytes
+    if isinstance(obj, dict): return sys.getsizeof(obj) + sum(footprint(k) + footprint(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)): return sys.getsizeof(obj) + sum(footprint(v) for v in obj)
+    return sys.getsizeof(obj)
+
+def session_memory(state, peak_key="mem_peak"):
+    # 目前 session_state 的大小與本 session 的峰值 (峰值存回 state)
+    now = sum(footprint(v) for k, v in state.items() if k != peak_key)
+    state[peak_key] = peak = max(state.get(peak_key, 0), now)
+    return now, peak
+
+def process_peak_rss():
+    # 整個 process 的最大常駐記憶體 (位元組)；非 Unix 平台回傳 None
+    try: import resource
+    except ImportError: return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
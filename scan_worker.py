@@ -0,0 +1,99 @@
+import argparse
+import glob
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from data_provider import get_provider, period_start
+from ohlcv_store import OHLCVStore
+from analysis import scan_universe, merge_scans, prefilter, PREFILTER
+from stock_db import STOCK_DB, FLAT_STOCK_DB
+from correlation import get_correlations
+
+# --- 背景掃描程式：多 process 平行評分，結果寫成有版本、時間戳記的快照檔；介面只讀最新一份 ---
+# 用法：python scan_worker.py [--sectors 半導體 金融] [--workers 4] [--every 600]  (板塊名稱可只寫部分文字)
+SNAPSHOT_VERSION = 1 # 快照內容格式改變時遞增，舊版快照不再讀取
+SNAPSHOT_DIR = os.environ.get("STOCK_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "snapshots"))
+SCAN_PERIOD = "6mo"
+
+def _scan_chunk(tickers):
+    # 在子 process 內執行：從本地行情資料庫唯讀自己那一段並評分 (資料已由主 process 同步；走 fetch 會因 refresh_interval 到期再下載)
+    provider = get_provider()
+    if isinstance(provider, OHLCVStore): return scan_universe(provider.read(tickers, period=SCAN_PERIOD))
+    return scan_universe(provider.fetch(tickers, period=SCAN_PERIOD))
+
+def run_scan(tickers, workers=None, chunk=100, progress=None):
+    tickers = list(dict.fromkeys(tickers))
+    provider = get_provider()
+    # 初篩 (最近幾根 K 棒的價格 / 成交金額) 在主 process 做，留下的才分給子 process 算完整指標
+    quick = provider.fetch(tickers, period=PREFILTER["period"], progress=progress)
+    tickers = prefilter(quick, PREFILTER["bars"], PREFILTER["min_price"], PREFILTER["min_value"])
+    if not tickers: return None
+    if isinstance(provider, OHLCVStore): # 網路下載只在主 process 做一次
+        provider.sync(tickers, want_from=period_start(SCAN_PERIOD, pd.Timestamp.now().normalize()), progress=progress)
+    chunks = [tickers[i:i+chunk] for i in range(0, len(tickers), chunk)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1: return merge_scans(map(_scan_chunk, chunks))
+    with ProcessPoolExecutor(max_workers=workers) as ex: return merge_scans(ex.map(_scan_chunk, chunks))
+
+# --- 快照檔 ---
+def list_snapshots(folder=SNAPSHOT_DIR):
+    # 檔名含版本與時間戳記，字典序即時間順序
+    return sorted(glob.glob(os.path.join(folder, f"scan-v{SNAPSHOT_VERSION}-*.pkl")))
+
+def write_snapshot(scan, universe, elapsed, folder=SNAPSHOT_DIR, keep=20):
+    os.makedirs(folder, exist_ok=True); created = pd.Timestamp.now()
+    path = os.path.join(folder, f"scan-v{SNAPSHOT_VERSION}-{created:%Y%m%d-%H%M%S}.pkl")
+    payload = {"version": SNAPSHOT_VERSION, "created": created, "universe": list(universe), "elapsed": elapsed, "scan": scan}
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f: pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path) # 原子替換，介面不會讀到寫一半的檔案
+    for old in list_snapshots(folder)[:-keep]: os.remove(old)
+    return path
+
+_latest = {}
+_latest_lock = threading.Lock()
+
+def load_latest_snapshot(folder=SNAPSHOT_DIR):
+    # 每個快照檔在 process 內只讀一次，所有 session 共用同一份 (唯讀)
+    paths = list_snapshots(folder)
+    if not paths: return None
+    with _latest_lock:
+        if paths[-1] not in _latest:
+            try:
+                with open(paths[-1], "rb") as f: payload = pickle.load(f)
+            except Exception as e:
+                print(f"Error loading snapshot {paths[-1]}: {e}")
+                return None
+            _latest.clear(); _latest[paths[-1]] = payload
+        return _latest[paths[-1]]
+
+def main():
+    parser = argparse.ArgumentParser(description="背景全市場掃描，輸出結果快照供介面讀取")
+    parser.add_argument("--sectors", nargs="*", help="只掃描指定板塊 (預設全部；可只寫部分名稱，如 半導體)")
+    parser.add_argument("--workers", type=int, default=None, help="process 數 (預設 CPU 核心數)")
+    parser.add_argument("--chunk", type=int, default=100, help="每個 process 一次處理的檔數")
+    parser.add_argument("--keep", type=int, default=20, help="保留最近幾份快照")
+    parser.add_argument("--every", type=float, default=0, help="每隔幾秒重掃一次 (0 = 只跑一次)")
+    args = parser.parse_args()
+    sectors = []
+    for name in args.sectors or []: # 完全相同優先，否則取名稱包含該文字的板塊 (板塊名稱前面有圖示)
+        hits = [name] if name in STOCK_DB else [s for s in STOCK_DB if name in s]
+        if not hits: parser.error(f"找不到板塊「{name}」，可用：{'、'.join(STOCK_DB)}")
+        sectors += [s for s in hits if s not in sectors]
+    universe = list(dict.fromkeys(t for s in sectors for t in STOCK_DB[s])) if sectors else list(FLAT_STOCK_DB)
+    while True:
+        t0 = time.perf_counter()
+        scan = run_scan(universe, workers=args.workers, chunk=args.chunk, progress=lambda done, n: print(f"\r下載行情 {done}/{n}", end="", flush=True))
+        elapsed = time.perf_counter() - t0
+        if scan is None: print("\n無可用資料，未寫入快照")
+        else: print(f"\n{len(scan['snap'])} 檔，{elapsed:.1f}s -> {write_snapshot(scan, universe, elapsed, keep=args.keep)}")
+        t1 = time.perf_counter(); table = get_correlations() # 順便預先算好當日相關係數表，深度透視與板塊熱圖直接查表
+        if table is not None: print(f"相關係數 {len(table.tickers)} 檔 × {len(table.benchmarks)} 基準，{time.perf_counter() - t1:.1f}s")
+        if not args.every: break
+        time.sleep(max(0.0, args.every - elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+from io import StringIO
+import pandas as pd
+from chip_crawler import clean_code
+
+# --- 資料庫：手動整理的主題板塊 ---
+THEME_DB = {
+    "💻 半導體權值": {"2330.TW": "台積電", "2454.TW": "聯發科", "2317.TW": "鴻海", "2303.TW": "聯電", "2308.TW": "台達電", "3711.TW": "日月光", "2379.TW": "瑞昱", "3034.TW": "聯詠", "3661.TW": "世芯-KY", "3443.TW": "創意", "6669.TW": "緯穎", "3035.TW": "智原", "3529.TW": "力旺", "5274.TW": "信驊", "3231.TW": "緯創", "2382.TW": "廣達", "2357.TW": "華碩", "2356.TW": "英業達", "2376.TW": "技嘉", "2324.TW": "仁寶"},
+    "⚡ 重電/綠能": {"1519.TW": "華城", "1513.TW": "中興電", "1503.TW": "士電", "1504.TW": "東元", "1514.TW": "亞力", "1609.TW": "大亞", "1605.TW": "華新", "1618.TW": "合機", "1616.TW": "億泰", "6806.TW": "森崴能源", "9958.TW": "世紀鋼", "3708.TW": "上緯投控", "6443.TW": "元晶"},
+    "🖥️ PCB/載板": {"3037.TW": "欣興", "8046.TW": "南電", "3189.TW": "景碩", "2368.TW": "金像電", "3044.TW": "健鼎", "6274.TW": "台燿", "2383.TW": "台光電", "6213.TW": "聯茂", "4958.TW": "臻鼎-KY", "2313.TW": "華通", "5469.TW": "瀚宇博", "8358.TW": "金居", "6269.TW": "台郡", "2355.TW": "敬鵬"},
+    "🤖 機器人/散熱": {"3017.TW": "奇鋐", "3324.TW": "雙鴻", "3483.TW": "力致", "2421.TW": "建準", "2354.TW": "鴻準", "2059.TW": "川湖", "2049.TW": "上銀", "1590.TW": "亞德客-KY", "2359.TW": "所羅門", "6188.TW": "廣明", "8374.TW": "羅昇", "2464.TW": "盟立"},
+    "📡 網通/低軌": {"2345.TW": "智邦", "5388.TWO": "中磊", "6285.TW": "啟碁", "3704.TW": "合勤控", "3596.TW": "智易", "4977.TW": "眾達-KY", "4906.TW": "正文", "3062.TW": "建漢", "2314.TW": "台揚", "3081.TW": "聯亞", "4979.TW": "華星光"},
+    "💰 金融/控股": {"2881.TW": "富邦金", "2882.TW": "國泰金", "2891.TW": "中信金", "2886.TW": "兆豐金", "5880.TW": "合庫金", "2884.TW": "玉山金", "5871.TW": "中租-KY", "2892.TW": "第一金", "2885.TW": "元大金", "2890.TW": "永豐金", "2883.TW": "開發金", "2887.TW": "台新金", "2834.TW": "臺企銀", "2809.TW": "京城銀"},
+    "🚢 航運/傳產": {"2603.TW": "長榮", "2609.TW": "陽明", "2615.TW": "萬海", "2618.TW": "長榮航", "2610.TW": "華航", "2606.TW": "裕民", "2637.TW": "慧洋-KY", "2002.TW": "中鋼", "1101.TW": "台泥", "1301.TW": "台塑", "1303.TW": "南亞", "1326.TW": "台化", "6505.TW": "台塑化", "2207.TW": "和泰車", "2912.TW": "統一超", "1216.TW": "統一", "2201.TW": "裕隆"},
+    "📱 光電/其他": {"3008.TW": "大立光", "3406.TW": "玉晶光", "2409.TW": "友達", "3481.TW": "群創", "2327.TW": "國巨", "2492.TW": "華新科", "3260.TWO": "威剛", "8299.TWO": "群聯", "2395.TW": "研華", "8454.TW": "富邦媒", "2412.TW": "中華電", "3045.TW": "台灣大", "4904.TW": "遠傳"}
+}
+
+THEME_TICKERS = frozenset(t for stocks in THEME_DB.values() for t in stocks) # 手動整理的個股一律掃描，不經初篩
+
+# --- 全市場清單 (本地檔案，約 1,800 檔上市櫃股票)：欄位 代號,名稱,市場,產業別 ---
+# 預設讀 universe.csv (可用 STOCK_UNIVERSE_FILE 指定)；執行 python stock_db.py --update 由證交所 ISIN 公開資料產生
+UNIVERSE_FILE = os.environ.get("STOCK_UNIVERSE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "universe.csv"))
+MARKET_SUFFIX = {"上市": ".TW", "上櫃": ".TWO"}
+ISIN_URL = "https://isin.twse.com.tw/isin/C_public.jsp?strMode={mode}" # 2 = 上市、4 = 上櫃
+
+def listing_ticker(code, market):
+    code = str(code).strip()
+    return code if "." in code else code + MARKET_SUFFIX.get(str(market).strip(), ".TW")
+
+def load_universe(path=UNIVERSE_FILE, themes=THEME_DB):
+    # 回傳 {板塊: {代號: 名稱}}：主題板塊在前 (名稱以手動整理的為準)，其後依清單的產業別分組；沒有清單檔時只有主題板塊
+    universe = {sector: dict(stocks) for sector, stocks in themes.items()}
+    if not path or not os.path.exists(path): return universe
+    try: listing = pd.read_csv(path, dtype=str, encoding="utf-8-sig").fillna("")
+    except Exception as e:
+        print(f"Error loading universe {path}: {e}")
+        return universe
+    for row in listing.itertuples(index=False):
+        ticker = listing_ticker(row.代號, row.市場)
+        universe.setdefault(row.產業別 or "其他", {})[ticker] = row.名稱
+    return universe
+
+def update_listing(path=UNIVERSE_FILE):
+    # 抓證交所 ISIN 上市 / 上櫃清單，只留普通股 (CFICode ES 開頭)，寫成 universe.csv
+    import requests
+    rows = []
+    for mode, market in (("2", "上市"), ("4", "上櫃")):
+        resp = requests.get(ISIN_URL.format(mode=mode), timeout=30); resp.encoding = "cp950" # 頁面含 big5 沒有的 MS950 字
+        table = pd.read_html(StringIO(resp.text), header=0)[0]
+        for name_col, cfi, industry in table[[table.columns[0], "CFICode", "產業別"]].itertuples(index=False):
+            if not str(cfi).startswith("ES") or "\u3000" not in str(name_col): continue
+            code, name = str(name_col).split("\u3000", 1)
+            rows.append({"代號": code.strip(), "名稱": name.strip(), "市場": market, "產業別": industry if isinstance(industry, str) else ""})
+    pd.DataFrame(rows).to_csv(path, index=False, encoding="utf-8-sig")
+    return len(rows)
+
+STOCK_DB = load_universe()
+FLAT_STOCK_DB = {}
+for stocks in STOCK_DB.values(): # 同一檔出現在多個板塊時，以第一次出現 (主題板塊) 的名稱為準
+    for ticker, name in stocks.items(): FLAT_STOCK_DB.setdefault(ticker, name)
+
+def get_stock_name(ticker): return FLAT_STOCK_DB.get(ticker, clean_code(ticker))
+
+if __name__ == "__main__":
+    import sys
+    if "--update" in sys.argv: print(f"{update_listing()} 檔 -> {UNIVERSE_FILE}")
+    else: print(f"{len(STOCK_DB)} 個板塊，{len(FLAT_STOCK_DB)} 檔")
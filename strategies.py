@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+# --- 宣告式策略：條件 / 權重 / 訊號名稱 / 嚴格模式門檻都是資料 ---
+# 條件寫法：(欄位, 運算子, 欄位或常數)，運算子 > < >= <= between；{"all": [...]} / {"any": [...]} 可巢狀
+# 右邊的字串若不是欄位名稱，就從該策略的 thresholds 取值 (例如 min_vol)
+STRATEGIES = {
+    "🚀 短線噴射 (飆股)": {
+        "rules": [
+            (("Vol_Ratio", ">", 1.5), 25, "爆量"),
+            (("Close", ">", "BB_High"), 25, "布林突破"),
+            (("BB_Width", "<", 0.15), 10, "壓縮"),
+            ({"all": [("MACD_Hist", ">", 0), ("MACD_Hist", ">", "Prev_MACD_Hist")]}, 20, "MACD翻紅"),
+        ],
+        "select": {"any": [("Close", ">", "BB_High"), ("Vol_Ratio", ">", "min_vol")]},
+        "thresholds": {False: {"min_score": 60, "min_vol": 1.5}, True: {"min_score": 75, "min_vol": 2.0}},
+        "bb_status": [(("Close", ">", "BB_High"), "🚀 突破噴出")],
+    },
+    "🌊 波段成長 (趨勢)": {
+        "rules": [
+            ({"all": [("MA5", ">", "MA20"), ("MA20", ">", "MA60")]}, 30, "均線多排"),
+            (("OBV", ">", "OBV_MA10"), 20, "籌碼吸納"),
+            (("MACD", ">", "MACD_Signal"), 20, "MACD金叉"),
+            (("Close", ">", "MA20"), 10, None),
+        ],
+        "select": ("MA5", ">", "MA20"),
+        "thresholds": {False: {"min_score": 60}, True: {"min_score": 75}},
+    },
+    "💎 長線價值 (低接)": {
+        "rules": [
+            (("MA20_Dist", "<", 0.03), 30, "回測月線"),
+            (("RSI", "between", (40, 60)), 20, None),
+            (("Bias20", "<", -5), 20, "負乖離超跌"),
+        ],
+        "select": {"all": [("Close", ">", "MA60"), ("RSI", "<", 70)]},
+        "thresholds": {False: {"min_score": 50}, True: {"min_score": 65}},
+    },
+}
+# 總分 -> 建議 (由高到低比對)
+ACTION_LEVELS = [(80, "🔥 強力買進"), (60, "✅ 建議佈局")]
+DEFAULT_ACTION = "觀察"
+DEFAULT_BB_STATUS = "一般"
+
+# 全部訊號名稱的位元編號 (跨策略共用)，結果只存一個整數
+SIGNALS = list(dict.fromkeys(label for s in STRATEGIES.values() for _, _, label in s["rules"] if label))
+SIGNAL_BITS = {label: 1 << i for i, label in enumerate(SIGNALS)}
+SIGNAL_DTYPE = np.min_scalar_type((1 << len(SIGNALS)) - 1)
+# 結果表的文字欄位用固定類別 (每列只存一個小整數代碼)
+ACTION_DTYPE = pd.CategoricalDtype([DEFAULT_ACTION] + [label for _, label in ACTION_LEVELS])
+BB_STATUS_DTYPE = pd.CategoricalDtype(list(dict.fromkeys([DEFAULT_BB_STATUS] + [label for s in STRATEGIES.values() for _, label in s.get("bb_status", [])])))
+
+def decode_signals(bits):
+    return [label for label, b in SIGNAL_BITS.items() if int(bits) & b]
+
+def derive_fields(fields):
+    # 由指標欄位衍生策略用的欄位；陣列可為 1-D (各股最新一列) 或 2-D (日期 × 個股)
+    f = dict(fields)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vma = np.asarray(f["Vol_MA5"], dtype=float)
+        f["Vol_Ratio"] = np.where(vma > 0, np.asarray(f["Volume"], dtype=float) / vma, 0.0)
+        f["Bias20"] = (f["Close"] - f["MA20"]) / f["MA20"] * 100
+        f["MA20_Dist"] = np.abs(f["Close"] - f["MA20"]) / f["MA20"]
+    return f
+
+# --- 編譯：條件 -> 對整個陣列運算的函式 ---
+_OPS = {">": np.greater, "<": np.less, ">=": np.greater_equal, "<=": np.less_equal}
+
+def compile_condition(spec):
+    if isinstance(spec, dict):
+        (kind, subs), = spec.items(); parts = [compile_condition(s) for s in subs]
+        reduce = np.logical_and if kind == "all" else np.logical_or
+        def combined(f, p):
+            out = parts[0](f, p)
+            for part in parts[1:]: out = reduce(out, part(f, p))
+            return out
+        return combined
+    lhs, op, rhs = spec
+    def operand(x, f, p):
+        if isinstance(x, str): return f[x] if x in f else p[x]
+        return x
+    if op == "between":
+        lo, hi = rhs
+        return lambda f, p: np.logical_and(f[lhs] >= lo, f[lhs] <= hi)
+    fn = _OPS[op]
+    return lambda f, p: fn(operand(lhs, f, p), operand(rhs, f, p))
+
+class CompiledStrategy:
+    def __init__(self, name, spec):
+        self.name = name; self.thresholds = spec["thresholds"]
+        self.rules = [(compile_condition(c), w, SIGNAL_BITS.get(label, 0)) for c, w, label in spec["rules"]]
+        self.select = compile_condition(spec["select"])
+        self.bb_status = [(compile_condition(c), label) for c, label in spec.get("bb_status", [])]
+
+    def score(self, f):
+        shape = np.shape(f["Close"]); score = np.zeros(shape, dtype=np.int32); bits = np.zeros(shape, dtype=np.int64)
+        for cond, w, bit in self.rules:
+            m = cond(f, {}); score += np.where(m, w, 0).astype(np.int32); bits |= np.where(m, bit, 0)
+        return score, bits
+
+    def evaluate(self, f):
+        # 回傳 總分 / 訊號位元 / 寬鬆與嚴格模式的入選遮罩 / 布林型態
+        shape = np.shape(f["Close"]); score, bits = self.score(f)
+        out = {"總分": score, "訊號": bits}
+        for strict, p in self.thresholds.items():
+            out["入選(嚴格)" if strict else "入選"] = self.selection(f, score, p)
+        status = np.full(shape, DEFAULT_BB_STATUS, dtype=object)
+        for cond, label in reversed(self.bb_status): status = np.where(cond(f, {}), label, status)
+        out["布林型態"] = status
+        return out
+
+    def selection(self, f, score, params):
+        # params 可自訂 (回測掃描門檻用)，需含 min_score 及 select 條件用到的其他門檻
+        return np.logical_and(self.select(f, params), score >= params["min_score"])
+
+COMPILED = {name: CompiledStrategy(name, spec) for name, spec in STRATEGIES.items()}
+
+def score_all(fields):
+    # 一次評估全部策略；fields 為 {欄位: 陣列}，回傳 {策略: {總分, 訊號, 入選, 入選(嚴格), 布林型態}}
+    f = derive_fields(fields)
+    return {name: s.evaluate(f) for name, s in COMPILED.items()}
+
+def score_table(snap):
+    # snap: indicators.latest_table 的結果 (個股為列)；回傳 {策略: DataFrame}，總分 int16、訊號為位元旗標、布林型態為類別欄
+    fields = {c: snap[c].to_numpy(dtype=float) for c in snap.columns if snap[c].dtype != object}
+    tables = {}
+    for name, res in score_all(fields).items():
+        res["總分"] = res["總分"].astype(np.int16); res["訊號"] = res["訊號"].astype(SIGNAL_DTYPE)
+        res["布林型態"] = pd.Categorical(res["布林型態"], dtype=BB_STATUS_DTYPE)
+        tables[name] = pd.DataFrame(res, index=snap.index)
+    return tables
+
+def action_for(score):
+    score = np.asarray(score); out = np.full(score.shape, DEFAULT_ACTION, dtype=object)
+    for level, label in reversed(ACTION_LEVELS): out = np.where(score >= level, label, out)
+    return out
+
+def action_category(score):
+    return pd.Categorical(action_for(score), dtype=ACTION_DTYPE)
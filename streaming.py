@@ -0,0 +1,148 @@
+import math
+import threading
+from collections import deque
+
+# --- 盤中串流指標：每檔一個狀態物件，新增/修正一根 K 棒都是 O(1) ---
+# 產出欄位與 indicators.latest_table 相同，可直接交給 evaluate_latest 評分
+NAN = float("nan")
+
+class _Window:
+    # 固定長度滾動和 / 平方和；記住最後一次被擠出的值，可撤銷最後一次 push (修正盤中 K 棒用)
+    def __init__(self, n, squares=False):
+        self.n = n; self.squares = squares; self.buf = deque(); self.sum = 0.0; self.sq = 0.0
+        self._evicted = None; self._pushes = 0
+
+    def push(self, x):
+        self.buf.append(x); self.sum += x; self.sq += x * x if self.squares else 0.0
+        self._evicted = self.buf.popleft() if len(self.buf) > self.n else None
+        if self._evicted is not None:
+            self.sum -= self._evicted; self.sq -= self._evicted ** 2 if self.squares else 0.0
+        self._pushes += 1
+        if self._pushes % 1000 == 0: self._resum() # 定期重算，避免浮點累積誤差
+
+    def undo(self):
+        x = self.buf.pop(); self.sum -= x; self.sq -= x * x if self.squares else 0.0
+        if self._evicted is not None:
+            self.buf.appendleft(self._evicted); self.sum += self._evicted; self.sq += self._evicted ** 2 if self.squares else 0.0
+            self._evicted = None
+        self._pushes -= 1
+
+    def _resum(self):
+        self.sum = math.fsum(self.buf); self.sq = math.fsum(x * x for x in self.buf) if self.squares else 0.0
+
+    @property
+    def full(self): return len(self.buf) == self.n
+
+    def mean(self): return self.sum / self.n if self.full else NAN
+
+    def std(self):
+        if not self.full: return NAN
+        m = self.sum / self.n; return math.sqrt(max(self.sq / self.n - m * m, 0.0))
+
+class _EMA:
+    # 等同 pandas ewm(adjust=False, min_periods=min_periods)
+    def __init__(self, alpha, min_periods):
+        self.alpha = alpha; self.min_periods = min_periods; self.value = NAN; self.count = 0
+
+    def push(self, x):
+        if math.isnan(x): return
+        self.value = x if self.count == 0 else (1 - self.alpha) * self.value + self.alpha * x; self.count += 1
+
+    def get(self): return self.value if self.count >= self.min_periods else NAN
+
+    def state(self): return (self.value, self.count)
+
+    def restore(self, s): self.value, self.count = s
+
+class StreamingIndicatorState:
+    def __init__(self):
+        self.c5 = _Window(5); self.c20 = _Window(20, squares=True); self.c60 = _Window(60); self.v5 = _Window(5)
+        self.obv10 = _Window(10); self.mfi_pos = _Window(14); self.mfi_neg = _Window(14)
+        self.ema12 = _EMA(2 / 13, 12); self.ema26 = _EMA(2 / 27, 26); self.signal = _EMA(2 / 10, 9)
+        self.rsi_up = _EMA(1 / 14, 14); self.rsi_dn = _EMA(1 / 14, 14)
+        self.recent = deque(maxlen=20) # (Open, Close, Volume) 供主力成本使用
+        self.obv = 0.0; self.last_close = NAN; self.prev_close = NAN; self.prev_tp = NAN; self.prev_hist = NAN; self.hist = NAN
+        self.bar = None; self.date = None; self.bars = 0; self._undo = None
+
+    @classmethod
+    def from_history(cls, df):
+        s = cls()
+        for ts, o, h, l, c, v in zip(df.index, df['Open'], df['High'], df['Low'], df['Close'], df['Volume']): s.append(ts, o, h, l, c, v)
+        return s
+
+    def _windows(self): return (self.c5, self.c20, self.c60, self.v5, self.obv10, self.mfi_pos, self.mfi_neg)
+
+    def append(self, date, open, high, low, close, volume):
+        open, high, low, close, volume = map(float, (open, high, low, close, volume))
+        # 保存新增前的純量狀態與前一根資料，revise 時整組還原 (O(1))
+        self._undo = (self.ema12.state(), self.ema26.state(), self.signal.state(), self.rsi_up.state(), self.rsi_dn.state(),
+                      self.obv, self.last_close, self.prev_close, self.prev_tp, self.prev_hist, self.hist, self.bar, self.date,
+                      self.recent[0] if len(self.recent) == self.recent.maxlen else None)
+        prior = self.last_close; diff = close - prior
+        self.c5.push(close); self.c20.push(close); self.c60.push(close); self.v5.push(volume)
+        self.ema12.push(close); self.ema26.push(close)
+        macd = self.ema12.get() - self.ema26.get(); self.signal.push(macd)
+        self.rsi_up.push(diff if diff > 0 else 0.0); self.rsi_dn.push(-diff if diff < 0 else 0.0)
+        self.obv += -volume if close < prior else volume; self.obv10.push(self.obv)
+        tp = (high + low + close) / 3.0; mf = tp * volume * (1 if tp > self.prev_tp else -1 if tp < self.prev_tp else 0)
+        self.mfi_pos.push(mf if mf >= 0 else 0.0); self.mfi_neg.push(mf if mf < 0 else 0.0)
+        self.recent.append((open, close, volume))
+        self.prev_hist = self.hist; self.hist = macd - self.signal.get()
+        self.prev_close = prior; self.last_close = close; self.prev_tp = tp
+        self.bar = (open, high, low, close, volume); self.date = date; self.bars += 1
+
+    def revise(self, open, high, low, close, volume):
+        # 修正最後一根 (盤中尚未收盤) K 棒：撤銷後重新 append
+        if self._undo is None: raise ValueError("no bar to revise")
+        u = self._undo; date = self.date
+        for w in self._windows(): w.undo()
+        for e, st in zip((self.ema12, self.ema26, self.signal, self.rsi_up, self.rsi_dn), u[:5]): e.restore(st)
+        self.obv, self.last_close, self.prev_close, self.prev_tp, self.prev_hist, self.hist, self.bar, self.date = u[5:13]
+        self.recent.pop()
+        if u[13] is not None: self.recent.appendleft(u[13])
+        self.bars -= 1
+        self.append(date, open, high, low, close, volume)
+
+    def latest(self):
+        o, h, l, c, v = self.bar
+        ma20 = self.c20.mean(); std = self.c20.std(); dn = self.rsi_dn.get(); up = self.rsi_up.get()
+        neg = abs(self.mfi_neg.sum) if self.mfi_neg.full else NAN; pos = self.mfi_pos.sum if self.mfi_pos.full else NAN
+        macd = self.ema12.get() - self.ema26.get()
+        big = max(self.recent, key=lambda r: r[2]) # 與 idxmax 相同：同量取最早一根
+        return {
+            "Open": o, "High": h, "Low": l, "Close": c, "Volume": v,
+            "MA5": self.c5.mean(), "MA20": ma20, "MA60": self.c60.mean(), "Vol_MA5": self.v5.mean(),
+            "RSI": 100.0 if dn == 0 else 100 - 100 / (1 + up / dn) if not math.isnan(dn) else NAN,
+            "MACD": macd, "MACD_Signal": self.signal.get(), "MACD_Hist": self.hist,
+            "OBV": self.obv, "OBV_MA10": self.obv10.mean(),
+            "MFI": _mfi(pos, neg),
+            "BB_High": ma20 + 2 * std, "BB_Low": ma20 - 2 * std, "BB_Width": 4 * std / ma20 if ma20 else NAN,
+            "Prev_Close": self.prev_close, "Prev_MACD_Hist": self.prev_hist,
+            "Big_Player_Cost": (big[0] + big[1]) / 2, "Bars": self.bars,
+        }
+
+def _mfi(pos, neg):
+    if math.isnan(pos) or math.isnan(neg): return NAN
+    if neg == 0: return 100.0 if pos > 0 else NAN
+    return 100 - 100 / (1 + pos / neg)
+
+# --- 全域串流狀態表 (process 層級，多個 session 共用) ---
+class StreamingRegistry:
+    def __init__(self):
+        self.states = {}; self._lock = threading.Lock()
+
+    def update(self, ticker, df):
+        # df 為該股完整或近期 K 棒；只處理狀態最後日期之後 (含) 的 K 棒
+        with self._lock:
+            st = self.states.get(ticker)
+            if st is None or st.date is None or st.date not in df.index:
+                st = self.states[ticker] = StreamingIndicatorState.from_history(df); return st.latest()
+            tail = df.loc[st.date:]
+            r = tail.iloc[0]; st.revise(r['Open'], r['High'], r['Low'], r['Close'], r['Volume'])
+            for ts, r in tail.iloc[1:].iterrows(): st.append(ts, r['Open'], r['High'], r['Low'], r['Close'], r['Volume'])
+            return st.latest()
+
+    def drop(self, ticker):
+        with self._lock: self.states.pop(ticker, None)
+
+REGISTRY = StreamingRegistry()
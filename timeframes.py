@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from cache import get_cache
+from data_provider import get_provider, period_start
+from indicators import Panel, compute_indicators, latest_table
+from strategies import score_table, compile_condition, derive_fields
+from profiling import timed
+
+# --- 多週期分析：每檔只抓一條基礎 K 線 (日 K 或 60 分 K)，週 / 月等較粗週期一律由它重新取樣，不另外下載 ---
+TIMEFRAMES = {"60m": "h", "1d": "D", "1wk": "W-FRI", "1mo": "M"} # 週期 -> 分組用的 period 頻率 (由細到粗)
+TF_LABELS = {"60m": "60分", "1d": "日線", "1wk": "週線", "1mo": "月線"}
+DEEP_TIMEFRAMES = ("1d", "1wk", "1mo") # 深度透視顯示的週期
+TF_LOOKBACK = {"60m": "60d", "1d": "6mo", "1wk": "2y", "1mo": "6y"} # 各週期算完整指標 (MA60) 需要的基礎資料長度
+
+# 多週期確認條件：{週期: 條件}，寫法與 strategies.STRATEGIES 相同；每個週期都成立才算確認
+MTF_RULES = {
+    "日線突破 + 週線多頭": {"1d": ("Close", ">", "BB_High"), "1wk": {"all": [("MA5", ">", "MA20"), ("Close", ">", "MA20")]}},
+    "日線MACD翻紅 + 週線站上月線": {"1d": {"all": [("MACD_Hist", ">", 0), ("MACD_Hist", ">", "Prev_MACD_Hist")]}, "1wk": ("Close", ">", "MA20")},
+    "週線多排 + 月線向上": {"1wk": {"all": [("MA5", ">", "MA20"), ("MA20", ">", "MA60")]}, "1mo": ("MA5", ">", "MA20")},
+}
+COMPILED_RULES = {name: {tf: compile_condition(c) for tf, c in spec.items()} for name, spec in MTF_RULES.items()}
+
+def resample(df, tf):
+    # 基礎 K 棒已依時間排序，同一區間必定相鄰：找出區間起點後用 reduceat 一次聚合 (比 DataFrame.resample 快一個數量級)
+    # 每根新 K 棒以區間內最後一根基礎 K 棒的時間為索引，尚未走完的本週 / 本月不會標到未來日期；日線以上只留日期
+    keys = df.index.to_period(TIMEFRAMES[tf]).asi8
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]); ends = np.r_[starts[1:], len(df)] - 1
+    o, h, l, c, v = (df[col].to_numpy(dtype=float) for col in ("Open", "High", "Low", "Close", "Volume"))
+    index = df.index[ends]
+    if tf != "60m": index = index.normalize()
+    return pd.DataFrame({"Open": o[starts], "High": np.maximum.reduceat(h, starts), "Low": np.minimum.reduceat(l, starts),
+                         "Close": c[ends], "Volume": np.add.reduceat(v, starts)}, index=index.rename(df.index.name or "Date"))
+
+def _base_key(ticker, df):
+    # 基礎 K 線多一根或盤中最後一根被修正，key 就跟著變
+    last = df.iloc[-1]
+    return (ticker, df.index[-1], len(df), float(last["Close"]), float(last["Volume"]))
+
+def resampled(ticker, df, tf, base="1d"):
+    order = list(TIMEFRAMES)
+    if order.index(tf) < order.index(base): raise ValueError(f"cannot derive {tf} from {base} bars")
+    if tf == base: return df
+    return get_cache("timeframe").get_or_compute((tf, *_base_key(ticker, df)), resample, (df, tf))
+
+def lookback(timeframes):
+    # 取各週期中最長的需求，一次抓足
+    now = pd.Timestamp.now().normalize()
+    return min((TF_LOOKBACK[tf] for tf in timeframes), key=lambda p: period_start(p, now))
+
+def fetch_base(tickers, timeframes, base="1d", provider=None):
+    return (provider or get_provider()).fetch(list(tickers), period=lookback(timeframes), interval=base)
+
+def _scan_timeframe(tf, frames, base):
+    tf_frames = {t: resampled(t, df, tf, base) for t, df in frames.items()}
+    panel = Panel.from_frames(tf_frames); snap = latest_table(panel, compute_indicators(panel))
+    return {"snap": snap, "scores": score_table(snap)}
+
+@timed("多週期/掃描")
+def mtf_scan(tickers, timeframes=DEEP_TIMEFRAMES, base="1d", frames=None):
+    # 回傳 {週期: {"snap", "scores"}}，各週期皆為整批向量化計算；同一批基礎資料的結果會快取
+    frames = frames if frames is not None else fetch_base(tickers, timeframes, base)
+    frames = {t: df for t, df in frames.items() if df is not None and len(df) > 1}
+    if not frames: return None
+    out = {}
+    for tf in timeframes:
+        key = ("scan", tf, base, tuple(_base_key(t, df) for t, df in frames.items()))
+        out[tf] = get_cache("timeframe").get_or_compute(key, _scan_timeframe, (tf, frames, base))
+    return out
+
+def rule_timeframes(name):
+    return tuple(MTF_RULES[name])
+
+def confirm(mtf, name):
+    # 回傳 DataFrame (個股 × 週期)，最後一欄「確認」為各週期條件皆成立
+    cols = {}
+    for tf, cond in COMPILED_RULES[name].items():
+        snap = mtf[tf]["snap"]; f = derive_fields({c: snap[c].to_numpy(dtype=float) for c in snap.columns})
+        cols[TF_LABELS[tf]] = pd.Series(cond(f, {}), index=snap.index)
+    table = pd.DataFrame(cols).fillna(False).astype(bool)
+    table["確認"] = table.all(axis=1)
+    return table